@@ -0,0 +1,48 @@
+"""Decode time of a 200 pod list page, ResourceInstance.to_dict versus raw parsing.
+
+    python benchmarks/bench_decode.py
+"""
+import json
+import timeit
+from kubernetes.dynamic.resource import ResourceInstance
+from pharos import utils
+
+
+POD = {
+    "apiVersion": "v1",
+    "kind": "Pod",
+    "metadata": {
+        "name": "nginx",
+        "namespace": "default",
+        "labels": {f"label-{i}": "value" for i in range(5)},
+    },
+    "spec": {
+        "containers": [
+            {
+                "name": f"container-{i}",
+                "image": "nginx:1.14.2",
+                "env": [{"name": f"ENV_{j}", "value": "x" * 20} for j in range(20)],
+            }
+            for i in range(3)
+        ]
+    },
+    "status": {"phase": "Running"},
+}
+PAGE = json.dumps({"kind": "PodList", "metadata": {}, "items": [POD] * 200}).encode()
+NUMBER = 10
+
+
+def main():
+    cases = {
+        "ResourceInstance.to_dict": lambda: ResourceInstance(None, json.loads(PAGE)).to_dict(),
+        "raw json": lambda: json.loads(PAGE),
+    }
+    if utils.orjson is not None:
+        cases["raw orjson"] = lambda: utils.orjson.loads(PAGE)
+    for name, case in cases.items():
+        seconds = timeit.timeit(case, number=NUMBER) / NUMBER
+        print(f"{name:25} {seconds * 1000:8.2f}ms per page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Per-object cost of reading a field value, jsonpath_ng versus compiled path.
+
+    python benchmarks/bench_fields.py
+"""
+import timeit
+from pharos import fields
+
+
+PATHS = ["metadata.name", 'metadata.annotations."pharos.py/template"']
+OBJECT = {
+    "metadata": {
+        "name": "nginx-deployment",
+        "namespace": "default",
+        "annotations": {"pharos.py/template": "test.yaml"},
+    },
+    "spec": {"replicas": 3},
+}
+NUMBER = 20000
+
+
+def main():
+    for path in PATHS:
+        field = fields.JsonPathField(path=path)
+        jsonpath = timeit.timeit(
+            lambda: fields.find_jsonpath_value(field.jsonpath_expr, OBJECT),
+            number=NUMBER,
+        )
+        compiled = timeit.timeit(lambda: field.get_value(OBJECT), number=NUMBER)
+        print(
+            f"{path:45} jsonpath {jsonpath / NUMBER * 1e6:8.2f}us"
+            f"  compiled {compiled / NUMBER * 1e6:8.2f}us"
+            f"  speedup {jsonpath / compiled:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
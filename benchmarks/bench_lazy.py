@@ -0,0 +1,58 @@
+"""Time and peak memory to pick 10 names out of a 200 item page of CRs with large status.
+
+    python benchmarks/bench_lazy.py
+"""
+import json
+import time
+import tracemalloc
+from pharos import lazy
+from pharos import utils
+
+
+ITEM = {
+    "apiVersion": "example.com/v1",
+    "kind": "Widget",
+    "metadata": {"name": "widget", "namespace": "default", "labels": {"app": "demo"}},
+    "spec": {"replicas": 3},
+    "status": {
+        "nodes": [
+            {"name": f"node-{i}", "ready": True, "message": "x" * 40, "ports": [80, 443]}
+            for i in range(500)
+        ]
+    },
+}
+ITEMS = [dict(ITEM, metadata=dict(ITEM["metadata"], name=f"w-{i}")) for i in range(200)]
+PAGE = json.dumps({"kind": "WidgetList", "metadata": {}, "items": ITEMS}).encode()
+WANTED = {f"w-{i}" for i in range(0, 200, 20)}
+
+
+def full():
+    page = utils.loads(PAGE)
+    return [i for i in page["items"] if i["metadata"]["name"] in WANTED]
+
+
+def lazy_page():
+    page = lazy.loads_page(PAGE)
+    return [i for i in page["items"] if i["metadata"]["name"] in WANTED]
+
+
+def measure(case):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = case()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert len(result) == len(WANTED)
+    return seconds, peak
+
+
+def main():
+    print(f"page size {len(PAGE) / 2 ** 20:.1f}MiB, orjson: {utils.orjson is not None}")
+    for name, case in [("full decode", full), ("lazy decode", lazy_page)]:
+        seconds, peak = measure(case)
+        print(f"{name:15} {seconds * 1000:8.1f}ms {peak / 2 ** 20:8.1f}MiB peak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Memory held by model wrappers for 100k pods, on top of the manifests themselves.
+
+    python benchmarks/bench_models.py
+"""
+import tracemalloc
+from collections import UserDict
+from pharos import models
+
+
+COUNT = 100_000
+
+
+class LegacyReadOnlyDict(UserDict):
+    def __init__(self, data):
+        self.data = data
+
+
+class LegacyPod:
+    def __init__(self, k8s_object, client):
+        self.k8s_object = LegacyReadOnlyDict(k8s_object)
+        self._client = client
+        self._variable_data = None
+        self._prefetched = None
+
+
+def measure(model, objects):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    instances = [model(client=None, k8s_object=i) for i in objects]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(i.size_diff for i in after.compare_to(before, "filename"))
+    del instances
+    return size
+
+
+def main():
+    objects = [
+        {"metadata": {"name": f"pod-{i}", "namespace": "default"}}
+        for i in range(COUNT)
+    ]
+    for name, model in [("dict + UserDict", LegacyPod), ("slots + Mapping", models.Pod)]:
+        size = measure(model, objects)
+        print(f"{name:20} {size / COUNT:8.1f} bytes per pod")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Wall-clock of a chunked list with and without background prefetch.
+
+Simulates 20ms of network latency per page and 20ms of processing per page.
+
+    python benchmarks/bench_prefetch.py
+"""
+import time
+from unittest import mock
+from pharos import iterator
+from pharos.client import Settings
+
+
+PAGES = 20
+LATENCY = 0.02
+PROCESSING = 0.02
+
+
+class FakeApiSpec:
+    group_version = "v1"
+    kind = "Pod"
+
+    def get(self, **kwargs):
+        time.sleep(LATENCY)
+        page = int(kwargs["_continue"] or 0) + 1
+        response = mock.Mock()
+        response.to_dict.return_value = {
+            "metadata": {"continue": str(page) if page < PAGES else None},
+            "items": [{"page": page}],
+        }
+        return response
+
+
+def run(prefetch_pages):
+    client = mock.Mock(chunk_sizes={})
+    client.settings = Settings()
+    client.settings["prefetch_pages"] = prefetch_pages
+    start = time.perf_counter()
+    for _ in iterator.ChunkIterator(client, FakeApiSpec()).get():
+        time.sleep(PROCESSING)
+    return time.perf_counter() - start
+
+
+def main():
+    serial = run(0)
+    for pages in (1, 2):
+        prefetched = run(pages)
+        print(
+            f"prefetch_pages={pages}  serial {serial:.2f}s"
+            f"  prefetch {prefetched:.2f}s  speedup {serial / prefetched:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,76 @@
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+class RenderCache:
+    """LRU cache of rendered specs, every get returns a fresh copy."""
+
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            value = self._data[key]
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
 class TemplateBackend:
     engine = None
+    cache = None
     prefix = "pharos.py"
+    # the hash annotation is only written when skip_unchanged reads it back
+    with_hash = False
 
     def render(self, namespace, template, variables, internal):
+        key = self.cache_key(namespace, template, variables, internal)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
         json_spec = self.engine.render(template, variables)
         if not internal:
             self.update_annotations(namespace, json_spec, template, variables)
+        if key is not None:
+            self.cache.set(key, json_spec)
         return json_spec
 
+    def cache_key(self, namespace, template, variables, internal):
+        # engines opt in by telling which version of a template would be used
+        if self.cache is None or not hasattr(self.engine, "template_key"):
+            return None
+        try:
+            data = json.dumps(variables, sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        fingerprint = hashlib.sha1(data.encode()).hexdigest()
+        return (
+            self.engine.template_key(template),
+            namespace,
+            internal,
+            self.with_hash,
+            fingerprint,
+        )
+
     def update_annotations(self, namespace, json_spec, template, variables):
         extra_annotations = {
             f"{self.prefix}/template": template,
@@ -20,6 +83,19 @@ class TemplateBackend:
             json_spec["metadata"]["annotations"].update(extra_annotations)
         else:
             json_spec["metadata"]["annotations"] = extra_annotations
+        if self.with_hash:
+            json_spec["metadata"]["annotations"][f"{self.prefix}/hash"] = spec_hash(
+                json_spec, variables
+            )
 
     def set_engine(self, engine):
         self.engine = engine
+
+    def set_cache(self, cache):
+        self.cache = cache
+
+
+def spec_hash(json_spec, variables):
+    """Hash of a rendered spec and its variables, same input gives same hash."""
+    data = json.dumps([json_spec, variables], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
@@ -1,13 +1,55 @@
+import hashlib
+import os
+import ssl
+import threading
+import time
 import kubernetes
 from collections import UserDict
+from pydoc import locate
+from kubernetes.client.rest import ApiException
+from kubernetes.dynamic import exceptions as api_exceptions
+from pharos import informer
+from pharos import jinja
+from pharos import backend
+from pharos import utils
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
 
 
 default_settings = {
     "disable_compress": False,
     "enable_chunk": True,
     "chunk_size": 200,
+    "adaptive_chunk": False,
+    "chunk_target_bytes": 2 * 1024 * 1024,
+    "chunk_target_seconds": 1.0,
+    "chunk_min_size": 10,
+    "chunk_max_size": 2000,
+    "prefetch_pages": 0,
+    "raw_decode": False,
+    "lazy_decode": False,
     "template_engine": "pharos.jinja.JinjaEngine",
     "jinja_loader": None,
+    "enable_informer": False,
+    "informer_timeout": 300,
+    "field_selector_pushdown": False,
+    "pushdown_in_limit": 10,
+    "resource_cache_ttl": 300,
+    "discovery_cache_dir": None,
+    "crd_established_timeout": 10,
+    "template_cache_size": 400,
+    "template_bytecode_cache_dir": None,
+    "render_cache_size": 0,
+    "update_strategy": "replace",
+    "field_manager": "pharos",
+    "force_conflicts": False,
+    "optimistic_update": False,
+    "conflict_retries": 3,
+    "conflict_backoff": 0.1,
+    "skip_unchanged": False,
 }
 
 
@@ -23,22 +65,286 @@ class Settings(UserDict):
             raise AttributeError("setting not found")
 
 
-class Client:
+class BaseClient:
+    def get_engine(self, internal=False):
+        """Template engine reused by every render of this client."""
+        if internal:
+            key = ("pharos.jinja.JinjaEngine", None, True)
+        else:
+            key = (self.settings.template_engine, self.settings.jinja_loader, False)
+        with self._engine_lock:
+            if key not in self._engines:
+                if internal:
+                    self._engines[key] = jinja.JinjaEngine(self, internal=True)
+                else:
+                    self._engines[key] = locate(self.settings.template_engine)(self)
+            return self._engines[key]
+
+    def get_render_cache(self):
+        size = self.settings.render_cache_size
+        if not size:
+            return None
+        with self._engine_lock:
+            if self._render_cache is None or self._render_cache.size != size:
+                self._render_cache = backend.RenderCache(size)
+            return self._render_cache
+
+
+class Client(BaseClient):
     k8s_client = None
 
     def __init__(self, path, context=None, **kwargs):
         self.path = path
         self.context = context
+        self.settings = Settings()
+        self.settings.update(kwargs)
         self.k8s_client = kubernetes.config.new_client_from_config(
             path, context=context
         )
-        self.dynamic_client = kubernetes.dynamic.DynamicClient(self.k8s_client)
-        self.settings = Settings()
-        self.settings.update(kwargs)
+        self._dynamic_client = None
+        self._resources = {}
+        self.informers = {}
+        self._informer_lock = threading.Lock()
+        self.variable_crd_ready = False
+        self._engines = {}
+        self._engine_lock = threading.Lock()
+        self._render_cache = None
+        self.chunk_sizes = {}
+        self._context_clients = {}
+        self._context_lock = threading.Lock()
+
+    @property
+    def dynamic_client(self):
+        # discovery starts on first use, not when the client is built
+        if self._dynamic_client is None:
+            self._dynamic_client = kubernetes.dynamic.DynamicClient(
+                self.k8s_client, cache_file=self.discovery_cache_file
+            )
+        return self._dynamic_client
+
+    @dynamic_client.setter
+    def dynamic_client(self, value):
+        self._dynamic_client = value
+        self._resources = {}
+
+    @property
+    def discovery_cache_file(self):
+        if not self.settings.discovery_cache_dir:
+            return None
+        key = f"{os.path.abspath(self.path)}:{self.context or ''}".encode()
+        return os.path.join(
+            self.settings.discovery_cache_dir,
+            f"pharos-{hashlib.sha1(key).hexdigest()}.json",
+        )
 
     def use_context(self, context):
         self.context = context
         self.k8s_client = kubernetes.config.new_client_from_config(
             self.path, context=context
         )
-        self.dynamic_client = kubernetes.dynamic.DynamicClient(self.k8s_client)
+        self.dynamic_client = None
+        self.variable_crd_ready = False
+        self.stop_informers()
+
+    def with_context(self, context):
+        """New client for another context of the same config, sharing settings."""
+        return self.__class__(self.path, context=context, **self.settings)
+
+    def get_context_client(self, context):
+        """with_context() client kept for later queries across contexts."""
+        with self._context_lock:
+            if context not in self._context_clients:
+                self._context_clients[context] = self.with_context(context)
+            return self._context_clients[context]
+
+    def get_resource(self, api_version, kind):
+        cached = self._resources.get((api_version, kind))
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        api_spec = self.dynamic_client.resources.get(
+            api_version=api_version, kind=kind
+        )
+        ttl = self.settings.resource_cache_ttl
+        if ttl:
+            self._resources[(api_version, kind)] = (time.monotonic() + ttl, api_spec)
+        return api_spec
+
+    def get_informer(self, api_version, kind):
+        with self._informer_lock:
+            instance = self.informers.get((api_version, kind))
+        if instance is None:
+            api_spec = self.get_resource(api_version, kind)
+            with self._informer_lock:
+                instance = self.informers.setdefault(
+                    (api_version, kind), informer.Informer(self, api_spec)
+                )
+        # the initial list runs outside the client lock
+        instance.start()
+        return instance
+
+    def stop_informers(self):
+        with self._informer_lock:
+            informers, self.informers = self.informers, {}
+        for instance in informers.values():
+            instance.stop()
+
+
+class AsyncResource:
+    """Async counterpart of a dynamic client resource, responses are dicts."""
+
+    query_names = {
+        "label_selector": "labelSelector",
+        "field_selector": "fieldSelector",
+        "limit": "limit",
+        "_continue": "continue",
+        "resource_version": "resourceVersion",
+        "resource_version_match": "resourceVersionMatch",
+    }
+
+    def __init__(self, client, api_version, kind, name, namespaced):
+        self.client = client
+        self.api_version = api_version
+        self.kind = kind
+        self.name = name
+        self.namespaced = namespaced
+        if "/" in api_version:
+            self.prefix = f"/apis/{api_version}"
+        else:
+            self.prefix = f"/api/{api_version}"
+
+    def path(self, name=None, namespace=None):
+        path = self.prefix
+        if self.namespaced and namespace:
+            path += f"/namespaces/{namespace}"
+        path += f"/{self.name}"
+        if name:
+            path += f"/{name}"
+        return path
+
+    async def get(self, name=None, namespace=None, header_params=None, **kwargs):
+        params = [
+            (self.query_names[k], str(v))
+            for k, v in kwargs.items()
+            if v is not None and k in self.query_names
+        ]
+        return await self.client.request(
+            "get", self.path(name, namespace), params=params, headers=header_params
+        )
+
+    async def create(self, body, namespace=None, query_params=None):
+        namespace = namespace or body["metadata"].get("namespace")
+        return await self.client.request(
+            "post", self.path(namespace=namespace), params=query_params, body=body
+        )
+
+    async def replace(self, body, namespace=None, query_params=None):
+        namespace = namespace or body["metadata"].get("namespace")
+        return await self.client.request(
+            "put",
+            self.path(body["metadata"]["name"], namespace),
+            params=query_params,
+            body=body,
+        )
+
+    async def delete(self, name, namespace=None):
+        return await self.client.request("delete", self.path(name, namespace))
+
+
+class AsyncClient(BaseClient):
+    """Client for asyncio code, used with the async QuerySet methods."""
+
+    def __init__(self, path, context=None, **kwargs):
+        if aiohttp is None:
+            raise ImportError("AsyncClient requires aiohttp, install pharos-k8s[async]")
+        self.path = path
+        self.context = context
+        self.settings = Settings()
+        self.settings.update(kwargs)
+        self.configuration = kubernetes.client.Configuration()
+        kubernetes.config.load_kube_config(
+            config_file=path,
+            context=context,
+            client_configuration=self.configuration,
+            persist_config=False,
+        )
+        self._session = None
+        self._resources = {}
+        self._engines = {}
+        self._engine_lock = threading.Lock()
+        self._render_cache = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(ssl=self._ssl_context())
+            )
+        return self._session
+
+    def _ssl_context(self):
+        if not self.configuration.verify_ssl:
+            return False
+        context = ssl.create_default_context(cafile=self.configuration.ssl_ca_cert)
+        if self.configuration.cert_file:
+            context.load_cert_chain(
+                self.configuration.cert_file, self.configuration.key_file
+            )
+        return context
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, method, path, params=None, body=None, headers=None):
+        headers = dict(headers or {})
+        headers.setdefault("Accept", "application/json")
+        for auth in self.configuration.auth_settings().values():
+            if auth["in"] == "header" and auth["value"]:
+                headers[auth["key"]] = auth["value"]
+
+        async with self.session.request(
+            method.upper(),
+            self.configuration.host + path,
+            params=params,
+            json=body,
+            headers=headers,
+        ) as response:
+            data = await response.read()
+            if response.status >= 400:
+                error = ApiException(response.status, response.reason)
+                error.body = data.decode("utf-8")
+                error.headers = response.headers
+                raise api_exceptions.api_exception(error)
+            return utils.loads(data)
+
+    async def get_resource(self, api_version, kind):
+        cached = self._resources.get((api_version, kind))
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        prefix = AsyncResource(self, api_version, kind, "", False).prefix
+        resource_list = await self.request("get", prefix)
+        for resource in resource_list["resources"]:
+            # skip subresources such as pods/status
+            if resource["kind"] == kind and "/" not in resource["name"]:
+                api_spec = AsyncResource(
+                    self, api_version, kind, resource["name"], resource["namespaced"]
+                )
+                break
+        else:
+            raise api_exceptions.ResourceNotFoundError(
+                f"No matches found for {api_version} {kind}"
+            )
+
+        ttl = self.settings.resource_cache_ttl
+        if ttl:
+            self._resources[(api_version, kind)] = (time.monotonic() + ttl, api_spec)
+        return api_spec
@@ -32,3 +32,7 @@ class TemplateNotValid(Exception):
 
 class ResourceNotMatch(Exception):
     pass
+
+
+class CrdNotEstablished(Exception):
+    pass
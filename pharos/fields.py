@@ -1,6 +1,8 @@
 from datetime import datetime
+from collections.abc import Mapping
 from pydoc import locate
 from jsonpath_ng.ext import parse
+from jsonpath_ng.jsonpath import Child, Fields, Root
 from pharos import lookups
 from pharos import exceptions
 
@@ -23,13 +25,14 @@ class RelatedField:
             self.through = through
 
     def __get__(self, obj, type=None):
-        if isinstance(self.to, str):
-            self.to = locate(self.to)
-        manager = self.to.objects
+        if obj is None:
+            return self
+        manager = self.related_models[-1].objects
         clone = manager.__class__()
         clone.model = manager.model
         clone.owner = obj
         clone._client = obj._client
+        clone._prefetched = obj._prefetched
         clone.skip_owner = self.skip_owner
         clone.from_field = self.from_field
         clone.to_field = self.to_field
@@ -38,6 +41,13 @@ class RelatedField:
             clone.through = self.through
         return clone
 
+    @property
+    def related_models(self):
+        """Models listed to resolve this relation, target model last."""
+        if isinstance(self.to, str):
+            self.to = locate(self.to)
+        return [i for i in (self.through, self.to) if i]
+
 
 class QueryField:
     operator_class = None
@@ -50,8 +60,10 @@ class QueryField:
         self.valid_lookups = {}
 
         self.jsonpath_expr = None
+        self.keys = None
         if self.path:
             self.jsonpath_expr = parse(self.path)
+            self.keys = compile_jsonpath(self.jsonpath_expr)
 
         for lookup in self.lookups:
             self.valid_lookups[lookup.name] = lookup(self.jsonpath_expr, field=self)
@@ -68,6 +80,18 @@ class QueryField:
     def get_value(self, obj):
         raise NotImplementedError()
 
+    @property
+    def metadata_only(self):
+        """True if the field reads nothing outside metadata."""
+        if not self.path:
+            return False
+        return self.path.lstrip("$.").split(".")[0] == "metadata"
+
+    def find(self, obj):
+        if self.keys is not None:
+            return find_path_value(self.keys, obj)
+        return find_jsonpath_value(self.jsonpath_expr, obj)
+
     def get_lookup(self, op):
         if op not in self.valid_lookups:
             raise exceptions.LookupNotValid(f"Lookup: {op} is not valid!")
@@ -84,6 +108,7 @@ class QueryField:
 class JsonPathField(QueryField):
     lookups = [
         lookups.JsonPathEqualLookup,
+        lookups.JsonPathNotEqualLookup,
         lookups.JsonPathInLookup,
         lookups.JsonPathContainsLookup,
         lookups.JsonPathStartsWithLookup,
@@ -94,12 +119,13 @@ class JsonPathField(QueryField):
     ]
 
     def get_value(self, obj):
-        return find_jsonpath_value(self.jsonpath_expr, obj)
+        return self.find(obj)
 
 
 class K8sApiField(QueryField):
     lookups = [
         lookups.ApiEqualLookup,
+        lookups.JsonPathNotEqualLookup,
         lookups.JsonPathInLookup,
         lookups.JsonPathContainsLookup,
         lookups.JsonPathStartsWithLookup,
@@ -110,7 +136,7 @@ class K8sApiField(QueryField):
     ]
 
     def get_value(self, obj):
-        return find_jsonpath_value(self.jsonpath_expr, obj)
+        return self.find(obj)
 
 
 class OwnerRefField(QueryField):
@@ -126,7 +152,7 @@ class LabelSelectorField(QueryField):
     path = "spec.selector"
 
     def get_value(self, obj):
-        data = find_jsonpath_value(self.jsonpath_expr, obj)
+        data = self.find(obj)
         if data:
             labels = [f"{k}={v}" for k, v in data.get("matchLabels", {}).items()]
             expressions = [
@@ -142,7 +168,7 @@ class ServiceSelectorField(QueryField):
     path = "spec.selector"
 
     def get_value(self, obj):
-        data = find_jsonpath_value(self.jsonpath_expr, obj)
+        data = self.find(obj)
         if data:
             labels = [f"{k}={v}" for k, v in data.items()]
             return ",".join(labels)
@@ -163,7 +189,7 @@ class DateTimeField(QueryField):
     ]
 
     def get_value(self, obj):
-        data = find_jsonpath_value(self.jsonpath_expr, obj)
+        data = self.find(obj)
         if data:
             data = data.replace("Z", "+00:00")
             return datetime.fromisoformat(data)
@@ -173,3 +199,48 @@ class DateTimeField(QueryField):
 def find_jsonpath_value(jsonpath_expr, data):
     matches = [i.value for i in jsonpath_expr.find(data)]
     return matches[0] if matches else None
+
+
+def compile_jsonpath(jsonpath_expr):
+    """Return the keys of a plain dotted path, None if jsonpath is required."""
+    if isinstance(jsonpath_expr, Root):
+        return ()
+    if isinstance(jsonpath_expr, Fields):
+        if len(jsonpath_expr.fields) == 1 and jsonpath_expr.fields[0] != "*":
+            return tuple(jsonpath_expr.fields)
+        return None
+    if isinstance(jsonpath_expr, Child):
+        left = compile_jsonpath(jsonpath_expr.left)
+        right = compile_jsonpath(jsonpath_expr.right)
+        if left is None or right is None:
+            return None
+        return left + right
+    return None
+
+
+def find_path_value(keys, data):
+    for key in keys:
+        try:
+            data = data[key]
+        except (KeyError, TypeError):
+            return None
+    return data
+
+
+def prune_paths(data, paths):
+    """Copy of data keeping only the given key paths, None keeps everything."""
+    result = {}
+    for keys in paths:
+        if not keys:
+            return data
+        source = data
+        for key in keys:
+            if not isinstance(source, Mapping) or key not in source:
+                break
+            source = source[key]
+        else:
+            target = result
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = source
+    return result
@@ -0,0 +1,126 @@
+import logging
+import threading
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from pharos import selectors
+
+
+logger = logging.getLogger(__name__)
+
+
+class Informer:
+    """List once and keep a watch open, answering queries from memory."""
+
+    supported_kwargs = {"name", "namespace", "label_selector", "field_selector"}
+    # request options only, the cache is at least as fresh as resourceVersion=0
+    ignored_kwargs = {"header_params", "resource_version"}
+
+    def __init__(self, client, api_spec):
+        self.client = client
+        self.api_spec = api_spec
+        self.resource_version = None
+        self._store = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._watcher = None
+
+    def start(self):
+        # callers of the same kind wait for the initial list, other kinds don't
+        with self._start_lock:
+            if self._thread:
+                return
+            self.relist()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        watcher = self._watcher
+        if watcher is not None:
+            watcher.stop()
+
+    def relist(self):
+        store = {}
+        _continue = None
+        while True:
+            response = self.api_spec.get(
+                limit=self.client.settings.chunk_size, _continue=_continue
+            ).to_dict()
+            for obj in response["items"]:
+                store[self._key(obj)] = obj
+            self.resource_version = response["metadata"].get("resourceVersion")
+            _continue = response["metadata"].get("continue")
+            if not _continue:
+                break
+        with self._lock:
+            self._store = store
+
+    def handle(self, event_type, obj):
+        self.resource_version = (obj.get("metadata") or {}).get(
+            "resourceVersion", self.resource_version
+        )
+        if event_type == "ERROR":
+            # a Status object, 410 Gone makes the watch loop relist
+            raise ApiException(status=obj.get("code"), reason=obj.get("message"))
+        if event_type == "BOOKMARK":
+            return
+        with self._lock:
+            if event_type == "DELETED":
+                self._store.pop(self._key(obj), None)
+            else:
+                self._store[self._key(obj)] = obj
+
+    def watch(self):
+        self._watcher = watch.Watch()
+        for event in self.api_spec.watch(
+            resource_version=self.resource_version,
+            timeout=self.client.settings.informer_timeout,
+            allow_watch_bookmarks=True,
+            watcher=self._watcher,
+        ):
+            if self._stopped.is_set():
+                return
+            self.handle(event["type"], event["raw_object"])
+
+    def _run(self):
+        expired = False
+        while not self._stopped.is_set():
+            try:
+                if expired:
+                    self.relist()
+                    expired = False
+                self.watch()
+            except ApiException as e:
+                # 410 Gone: resourceVersion is too old to resume from, relist
+                expired = e.status == 410
+                if not expired:
+                    logger.warning("watch %s failed: %s", self.api_spec.kind, e)
+                    self._stopped.wait(1)
+            except Exception as e:
+                logger.warning("watch %s failed: %s", self.api_spec.kind, e)
+                self._stopped.wait(1)
+
+    @classmethod
+    def can_serve(cls, api_kwargs):
+        if not set(api_kwargs) - cls.ignored_kwargs <= cls.supported_kwargs:
+            return False
+        try:
+            selectors.parse_label_selector(api_kwargs.get("label_selector") or "")
+            selectors.parse_field_selector(api_kwargs.get("field_selector") or "")
+        except ValueError:
+            return False
+        return True
+
+    def list(self, **kwargs):
+        for key in self.ignored_kwargs:
+            kwargs.pop(key, None)
+        with self._lock:
+            objects = list(self._store.values())
+        return [i for i in objects if selectors.match(i, **kwargs)]
+
+    @staticmethod
+    def _key(obj):
+        metadata = obj["metadata"]
+        return metadata.get("namespace"), metadata["name"]
@@ -1,10 +1,29 @@
+import queue
+import threading
+import time
+from pharos import lazy
+from pharos import utils
+
+
 class SimpleIterator:
     def __init__(self, client, api_spec):
         self.client = client
         self.api_spec = api_spec
+        self.response_size = None
+
+    def request(self, **kwargs):
+        settings = self.client.settings
+        if settings.raw_decode or settings.lazy_decode or settings.adaptive_chunk:
+            # skip ResourceInstance, parse the response body once
+            response = self.api_spec.get(serialize=False, **kwargs)
+            self.response_size = len(response.data)
+            if settings.lazy_decode:
+                return lazy.loads_page(response.data)
+            return utils.loads(response.data)
+        return self.api_spec.get(**kwargs).to_dict()
 
     def get(self, **kwargs):
-        result = self.api_spec.get(**kwargs).to_dict()
+        result = self.request(**kwargs)
         if "items" not in result:
             result = [result]
         else:
@@ -14,21 +33,126 @@ class SimpleIterator:
 
 class ChunkIterator(SimpleIterator):
     def get(self, **kwargs):
-        chunk_size = self.client.settings.chunk_size
+        pages = self.pages(**kwargs)
+        if self.client.settings.prefetch_pages:
+            pages = prefetch(pages, self.client.settings.prefetch_pages)
+
+        for results in pages:
+            yield from results
+
+    def pages(self, **kwargs):
+        settings = self.client.settings
+        # page sizes learned per kind, list calls for metadata only are smaller
+        accept = (kwargs.get("header_params") or {}).get("Accept")
+        key = (self.api_spec.group_version, self.api_spec.kind, accept)
+        chunk_size = settings.chunk_size
+        if settings.adaptive_chunk:
+            chunk_size = self.client.chunk_sizes.get(key, chunk_size)
         _continue = None
         END = "END"
-        kwargs["limit"] = chunk_size
 
         while _continue != END:
             kwargs["_continue"] = _continue
-            response = self.api_spec.get(**kwargs).to_dict()
+            kwargs["limit"] = chunk_size
+            start = time.monotonic()
+            response = self.request(**kwargs)
+
+            if "items" not in response:
+                yield [response]
+                break
+
+            if settings.adaptive_chunk:
+                chunk_size = adapt_chunk_size(
+                    settings,
+                    chunk_size,
+                    len(response["items"]),
+                    self.response_size,
+                    time.monotonic() - start,
+                )
+                self.client.chunk_sizes[key] = chunk_size
+            _continue = response["metadata"].get("continue") or END
+            # the continue token pins the snapshot, it can't be combined with
+            # a resourceVersion
+            kwargs.pop("resource_version", None)
+            yield response["items"]
+
+
+class AsyncSimpleIterator(SimpleIterator):
+    async def get(self, **kwargs):
+        result = await self.api_spec.get(**kwargs)
+        for obj in result["items"] if "items" in result else [result]:
+            yield obj
+
+
+class AsyncChunkIterator(SimpleIterator):
+    async def get(self, **kwargs):
+        _continue = None
+        END = "END"
+        kwargs["limit"] = self.client.settings.chunk_size
+
+        while _continue != END:
+            kwargs["_continue"] = _continue
+            response = await self.api_spec.get(**kwargs)
 
             if "items" not in response:
                 yield response
                 break
 
             _continue = response["metadata"].get("continue") or END
-            results = response["items"]
+            kwargs.pop("resource_version", None)
+            for obj in response["items"]:
+                yield obj
+
+
+def adapt_chunk_size(settings, chunk_size, items, size, seconds):
+    """Next page size, aiming at the target bytes and seconds per page."""
+    if not items:
+        return chunk_size
+    wanted = []
+    if size:
+        wanted.append(settings.chunk_target_bytes * items / size)
+    if seconds > 0:
+        wanted.append(settings.chunk_target_seconds * items / seconds)
+    if not wanted:
+        return chunk_size
+    # grow at most twice per page so a wrong guess can't spike memory,
+    # shrink right away
+    chunk_size = min(min(wanted), chunk_size * 2)
+    return int(max(settings.chunk_min_size, min(settings.chunk_max_size, chunk_size)))
+
+
+def prefetch(pages, size):
+    """Pull pages on a background thread, buffering up to size pages."""
+    buffer = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+    END = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for page in pages:
+                if not put((page, None)):
+                    return
+            put((END, None))
+        except Exception as e:
+            put((END, e))
 
-            while results:
-                yield results.pop(0)
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            page, error = buffer.get()
+            if error:
+                raise error
+            if page is END:
+                return
+            yield page
+    finally:
+        stopped.set()
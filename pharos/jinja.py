@@ -1,5 +1,5 @@
 import yaml
-from jinja2 import Environment, PackageLoader
+from jinja2 import Environment, FileSystemBytecodeCache, PackageLoader
 
 
 def to_yaml(value):
@@ -13,9 +13,22 @@ class JinjaEngine:
             loader = PackageLoader("pharos", "templates")
         elif not loader:
             raise
-        self.env = Environment(loader=loader)
+        bytecode_cache = None
+        if client.settings.template_bytecode_cache_dir:
+            bytecode_cache = FileSystemBytecodeCache(
+                client.settings.template_bytecode_cache_dir
+            )
+        self.env = Environment(
+            loader=loader,
+            cache_size=client.settings.template_cache_size,
+            bytecode_cache=bytecode_cache,
+        )
         self.env.filters["yaml"] = to_yaml
 
+    def template_key(self, template_path):
+        # a new Template object is loaded when the source changes on disk
+        return self.env.get_template(template_path)
+
     def render(self, template_path, variables):
         template = self.env.get_template(template_path)
         yaml_spec = template.render(**variables)
@@ -0,0 +1,156 @@
+import re
+from collections.abc import Mapping
+from pharos import utils
+
+
+STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+# deeper patterns scan faster but keep more regex state on large items
+NESTING = 3
+
+
+def content(stop, depth):
+    """Pattern for JSON text without the stop characters at its own level.
+
+    Strings and containers up to depth levels deep are consumed whole, so
+    the regex engine does the scanning instead of a Python loop.
+    """
+    value = STRING
+    if depth:
+        inner = content(rb"{}\[\]", depth - 1)
+        value = rb"(?:" + STRING + rb"|\{" + inner + rb"\}|\[" + inner + rb"\])"
+    plain = rb'[^"' + stop + rb"]*"
+    return plain + rb"(?:" + value + plain + rb")*"
+
+
+BRACKET = re.compile(content(rb"{}\[\]", NESTING))
+VALUE = re.compile(content(rb"{}\[\],:", NESTING))
+KEY = re.compile(rb"\s*(" + STRING + rb")\s*:")
+ARRAY = re.compile(rb"\s*\[")
+CLOSE = re.compile(rb"\s*[\]}]")
+
+
+def skip(data, pos):
+    """Offset past the container whose opening bracket ends at pos."""
+    depth = 1
+    while depth:
+        pos = BRACKET.match(data, pos).end()
+        char = data[pos : pos + 1]
+        if not char:
+            raise ValueError("unterminated JSON container")
+        depth += 1 if char in b"{[" else -1
+        pos += 1
+    return pos
+
+
+def value_end(data, pos):
+    """Offset of the comma or closing bracket after the value at pos."""
+    while True:
+        pos = VALUE.match(data, pos).end()
+        char = data[pos : pos + 1]
+        if char == b"{" or char == b"[":
+            # nested deeper than the pattern goes
+            pos = skip(data, pos + 1)
+        elif char and char != b":":
+            return pos
+        else:
+            raise ValueError("invalid JSON value")
+
+
+def member(data, pos):
+    """Key and value span of the object member at pos, with the next member offset.
+
+    Returns None at the end of the object, the next offset is None after the
+    last member.
+    """
+    key = KEY.match(data, pos)
+    if key is None:
+        return None
+    start = key.end()
+    end = value_end(data, start)
+    following = end + 1 if data[end : end + 1] == b"," else None
+    return utils.loads(key.group(1)), start, end, following
+
+
+def elements(data, pos):
+    """Spans of the array elements starting at pos, and the offset past the array."""
+    spans = []
+    close = CLOSE.match(data, pos)
+    if close:
+        return spans, close.end()
+    while True:
+        end = value_end(data, pos)
+        spans.append((pos, end))
+        if data[end : end + 1] != b",":
+            return spans, end + 1
+        pos = end + 1
+
+
+class LazyObject(Mapping):
+    """Object kept as raw JSON, each top level key is decoded on first access.
+
+    Keys are scanned in order and only as far as the one asked for, so reading
+    metadata does not walk past a large status.
+    """
+
+    __slots__ = ("raw", "_next", "_spans", "_values")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._next = raw.index(b"{") + 1
+        self._spans = {}
+        self._values = {}
+
+    def _scan(self, key=None):
+        while self._next is not None and key not in self._spans:
+            found = member(self.raw, self._next)
+            if found is None:
+                self._next = None
+                break
+            name, start, end, self._next = found
+            self._spans[name] = (start, end)
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        self._scan(key)
+        start, end = self._spans[key]
+        value = self._values[key] = utils.loads(self.raw[start:end])
+        return value
+
+    def __iter__(self):
+        self._scan()
+        return iter(self._spans)
+
+    def __len__(self):
+        self._scan()
+        return len(self._spans)
+
+    def __contains__(self, key):
+        self._scan(key)
+        return key in self._spans
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def loads_page(data):
+    """Decode a list response, leaving each item as a LazyObject."""
+    page = {}
+    pos = data.index(b"{") + 1
+    while pos is not None:
+        key = KEY.match(data, pos)
+        if key is None:
+            break
+        name, start = utils.loads(key.group(1)), key.end()
+        array = ARRAY.match(data, start) if name == "items" else None
+        if array is None:
+            end = value_end(data, start)
+            page[name] = utils.loads(data[start:end])
+        else:
+            spans, close = elements(data, array.end())
+            page[name] = [LazyObject(data[i:j]) for i, j in spans]
+            end = value_end(data, close)
+        pos = end + 1 if data[end : end + 1] == b"," else None
+    return page
@@ -18,6 +18,10 @@ class Lookup:
     def validate(self, obj, data):
         raise NotImplementedError
 
+    def field_selector(self, path, value):
+        """Field selector terms, any of which matches like this lookup."""
+        return None
+
 
 class ApiEqualLookup(Lookup):
     name = "equal"
@@ -54,6 +58,29 @@ class JsonPathEqualLookup(Lookup):
             return data
         raise exceptions.ValidationError()
 
+    def field_selector(self, path, value):
+        value = selector_value(value)
+        if value is None:
+            return None
+        return [f"{path}={value}"]
+
+
+class JsonPathNotEqualLookup(Lookup):
+    name = "ne"
+    type = Lookup.POST
+
+    def validate(self, obj, data):
+        valid = obj != data
+        if valid:
+            return data
+        raise exceptions.ValidationError()
+
+    def field_selector(self, path, value):
+        value = selector_value(value)
+        if value is None:
+            return None
+        return [f"{path}!={value}"]
+
 
 class ApiInLookup(Lookup):
     name = "in"
@@ -70,6 +97,12 @@ class JsonPathInLookup(Lookup):
             return data
         raise exceptions.ValidationError()
 
+    def field_selector(self, path, value):
+        values = [selector_value(i) for i in value]
+        if not values or None in values:
+            return None
+        return [f"{path}={i}" for i in dict.fromkeys(values)]
+
 
 class JsonPathContainsLookup(Lookup):
     name = "contains"
@@ -162,3 +195,13 @@ class OwnerRefInLookup(Lookup):
         if valid:
             return data
         raise exceptions.ValidationError()
+
+
+def selector_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, str):
+        return value.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=")
+    return None
@@ -1,5 +1,4 @@
 import inspect
-from pharos import exceptions
 from pharos.query import QuerySet
 
 
@@ -13,6 +12,7 @@ class BaseManager:
         self.owner = None
         self.through = None
         self._client = None
+        self._prefetched = None
 
     def __str__(self):
         return f"<{self.model.Meta.kind} manager>"
@@ -58,28 +58,24 @@ class BaseManager:
         if not self.owner:
             return self._queryset_class(model=self.model, using=self._client)
 
+        queryset = self._queryset_class(model=self.model, using=self._client)
+        queryset._prefetched = self._prefetched
         selector = getattr(self.owner, self.from_field, self.owner.selector)
         if self.through:
+            # owners and owned objects always share the namespace
             owners = self.through.objects.using(self._client).filter(
-                selector=selector, owner=self.owner
+                selector=selector, owner=self.owner, namespace=self.owner.namespace
             )
-            return (
-                self._queryset_class(
-                    model=self.model,
-                    using=self._client,
-                )
-                .filter(owner__in=owners)
-                .filter(selector=selector)
+            owners._prefetched = self._prefetched
+            return queryset.filter(owner__in=owners).filter(
+                selector=selector, namespace=self.owner.namespace
             )
 
         filterset = {self.to_field: selector}
         if not self.skip_owner:
             filterset["owner"] = self.owner
         filterset['namespace'] = self.owner.namespace
-        return self._queryset_class(
-            model=self.model,
-            using=self._client,
-        ).filter(**filterset)
+        return queryset.filter(**filterset)
 
 
 class Manager(BaseManager.from_queryset(QuerySet)):
@@ -1,5 +1,6 @@
+import random
+import time
 import yaml
-from pydoc import locate
 from kubernetes.dynamic import exceptions as api_exceptions
 from pharos import managers
 from pharos import fields
@@ -22,14 +23,17 @@ class Model:
         skip_owner=True,
     )
     template = fields.JsonPathField(path='metadata.annotations."pharos.py/template"')
+    spec_hash = fields.JsonPathField(path='metadata.annotations."pharos.py/hash"')
 
     objects = managers.Manager()
-    _client = None
+
+    __slots__ = ("k8s_object", "_client", "_variable_data", "_prefetched")
 
     def __init__(self, k8s_object, client):
         self.k8s_object = utils.ReadOnlyDict(k8s_object)
         self._client = client
         self._variable_data = None
+        self._prefetched = None
 
     def __repr__(self):
         return f"<{self.Meta.kind}: {self.name}>"
@@ -37,32 +41,46 @@ class Model:
     def __str__(self):
         return self.name or ""
 
+    @property
+    def client(self):
+        return self._client
+
     def refresh(self):
-        client = self._client.dynamic_client
-        api_spec = client.resources.get(
-            api_version=self.Meta.api_version, kind=self.Meta.kind
-        )
+        api_spec = self._client.get_resource(self.Meta.api_version, self.Meta.kind)
         result = api_spec.get(
             name=self.name, namespace=self.namespace or "default"
         ).to_dict()
         self.k8s_object = utils.ReadOnlyDict(result)
 
+    async def arefresh(self):
+        api_spec = await self._client.get_resource(
+            self.Meta.api_version, self.Meta.kind
+        )
+        result = await api_spec.get(
+            name=self.name, namespace=self.namespace or "default"
+        )
+        self.k8s_object = utils.ReadOnlyDict(result)
+
     def reload(self):
         resource_version = self.resource_version
         template_backend = backend.TemplateBackend()
-        engine = locate(self._client.settings.template_engine)(self._client)
-        template_backend.set_engine(engine)
+        template_backend.set_engine(self._client.get_engine())
+        template_backend.set_cache(self._client.get_render_cache())
+        template_backend.with_hash = self._client.settings.skip_unchanged
         template = self.template
         variable = self.variable_data
         if template and variable:
-            json_spec = template_backend.render(template, variable, internal=False)
+            json_spec = template_backend.render(
+                self.namespace, template, variable, internal=False
+            )
             json_spec["metadata"]["resourceVersion"] = resource_version
             self.k8s_object = utils.ReadOnlyDict(json_spec)
         else:
             raise exceptions.TemplateNotValid("Load template/variable failed!")
 
     def deploy(self, dry_run=False):
-        self.refresh()  # make sure we have latest resource version
+        if self._needs_refresh():
+            self.refresh()  # make sure we have latest resource version
 
         variable_obj = self.variable.get()
         variable_data = (
@@ -71,18 +89,57 @@ class Model:
             else variable_obj.data
         )
 
-        json_spec = self.objects.using(self._client)._update(
+        previous = self._previous_spec(variable_obj.data)
+        json_spec = self._retry_conflict(
+            lambda: self.objects.using(self._client)._update(
+                self.namespace,
+                self.template,
+                variable_data,
+                self.resource_version,
+                dry_run=dry_run,
+                previous=previous,
+                skip_hash=self._skip_hash(),
+            )
+        )
+        if json_spec is None:
+            return  # rendered spec and variables are what the server has
+        self.k8s_object = utils.ReadOnlyDict(json_spec)
+        if dry_run:
+            return
+
+        self.variable._update(
+            self.namespace,
+            "variables.yaml",
+            {"name": self.variable_name, "value": variable_data},
+            variable_obj.resource_version,
+            internal=True,
+        )
+
+    async def adeploy(self, dry_run=False):
+        await self.arefresh()
+
+        variable_obj = await self.variable.aget()
+        variable_data = (
+            self._variable_data
+            if self._variable_data is not None
+            else variable_obj.data
+        )
+
+        json_spec = await self.objects.using(self._client)._aupdate(
             self.namespace,
             self.template,
             variable_data,
             self.resource_version,
             dry_run=dry_run,
+            skip_hash=self._skip_hash(),
         )
+        if json_spec is None:
+            return
         self.k8s_object = utils.ReadOnlyDict(json_spec)
         if dry_run:
             return
 
-        self.variable._update(
+        await self.variable._aupdate(
             self.namespace,
             "variables.yaml",
             {"name": self.variable_name, "value": variable_data},
@@ -91,14 +148,25 @@ class Model:
         )
 
     def sync(self, template, variable, dry_run=False):
-        self.refresh()
-
-        json_spec = self.objects.using(self._client)._update(
-            self.namespace,
-            template,
-            variable,
-            self.resource_version,
-            dry_run=dry_run,
+        if self._needs_refresh():
+            self.refresh()
+
+        previous = None
+        if self._client.settings.update_strategy == "merge":
+            try:
+                previous = self._previous_spec(self.variable.get().data)
+            except exceptions.ObjectDoesNotExist:
+                pass
+
+        json_spec = self._retry_conflict(
+            lambda: self.objects.using(self._client)._update(
+                self.namespace,
+                template,
+                variable,
+                self.resource_version,
+                dry_run=dry_run,
+                previous=previous,
+            )
         )
         self.k8s_object = utils.ReadOnlyDict(json_spec)
         if dry_run:
@@ -118,7 +186,8 @@ class Model:
         )
 
     def delete(self):
-        self.refresh()
+        if not self._client.settings.optimistic_update:
+            self.refresh()
 
         try:
             self.variable.delete(name=self.variable_name)
@@ -129,12 +198,45 @@ class Model:
             name=self.name, namespace=self.namespace
         )
 
+    def _previous_spec(self, variable_data):
+        """Spec rendered last time, a merge patch removes what it no longer has."""
+        if self._client.settings.update_strategy != "merge" or not self.template:
+            return None
+        return self.objects.using(self._client)._render(
+            self.namespace, self.template, variable_data
+        )
+
+    def _skip_hash(self):
+        if self._client.settings.skip_unchanged:
+            return self.spec_hash
+        return None
+
+    def _needs_refresh(self):
+        settings = self._client.settings
+        return settings.update_strategy == "replace" and not settings.optimistic_update
+
+    def _retry_conflict(self, write):
+        """Write with the cached resource version, refresh and retry on 409."""
+        settings = self._client.settings
+        if not settings.optimistic_update:
+            return write()
+        for attempt in range(settings.conflict_retries + 1):
+            try:
+                return write()
+            except api_exceptions.ConflictError:
+                if attempt == settings.conflict_retries:
+                    raise
+            # jitter so concurrent writers don't retry in lockstep
+            backoff = settings.conflict_backoff * 2 ** attempt
+            time.sleep(backoff * random.uniform(0.5, 1.5))
+            self.refresh()
+
     def set_variable(self, variable):
         self._variable_data = variable
 
     @property
     def yaml(self):
-        return yaml.dump(self.k8s_object, default_flow_style=False)
+        return yaml.dump(dict(self.k8s_object), default_flow_style=False)
 
     @property
     def variable_name(self):
@@ -149,17 +251,32 @@ class Model:
 
 
 class Pod(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "v1"
         kind = "Pod"
+        field_selectors = (
+            "spec.nodeName",
+            "spec.restartPolicy",
+            "spec.schedulerName",
+            "spec.serviceAccountName",
+            "spec.hostNetwork",
+            "status.phase",
+            "status.podIP",
+            "status.nominatedNodeName",
+        )
 
 
 class Node(Model):
+    __slots__ = ()
+
     pods = fields.RelatedField(to=Pod, to_field="field_selector", skip_owner=True)
 
     class Meta:
         api_version = "v1"
         kind = "Node"
+        field_selectors = ("spec.unschedulable",)
 
     @property
     def selector(self):
@@ -167,14 +284,19 @@ class Node(Model):
 
 
 class ReplicaSet(Model):
+    __slots__ = ()
+
     pods = fields.RelatedField(to=Pod)
 
     class Meta:
         api_version = "v1"
         kind = "ReplicaSet"
+        field_selectors = ("status.replicas",)
 
 
 class Deployment(Model):
+    __slots__ = ()
+
     replicasets = fields.RelatedField(to=ReplicaSet)
     pods = fields.RelatedField(to=Pod, through=ReplicaSet)
 
@@ -184,60 +306,95 @@ class Deployment(Model):
 
 
 class StatefulSet(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "v1"
         kind = "StatefulSet"
 
 
 class ConfigMap(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "v1"
         kind = "ConfigMap"
 
 
 class CronJob(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "batch/v2alpha1"
         kind = "CronJob"
 
 
 class DaemonSet(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "v1"
         kind = "DaemonSet"
 
 
 class Endpoints(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "v1"
         kind = "Endpoints"
 
 
 class Event(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "v1"
         kind = "Event"
+        field_selectors = (
+            "involvedObject.kind",
+            "involvedObject.namespace",
+            "involvedObject.name",
+            "involvedObject.uid",
+            "involvedObject.apiVersion",
+            "involvedObject.resourceVersion",
+            "involvedObject.fieldPath",
+            "reason",
+            "reportingComponent",
+            "source",
+            "type",
+        )
 
 
 class Ingress(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "networking.k8s.io/v1beta1"
         kind = "Ingress"
 
 
 class Job(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "batch/v1"
         kind = "Job"
+        field_selectors = ("status.successful",)
 
 
 class Namespace(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "v1"
         kind = "Namespace"
+        field_selectors = ("status.phase",)
 
 
 class Service(Model):
+    __slots__ = ()
+
     pods = fields.RelatedField(to=Pod, skip_owner=True)
     selector = fields.ServiceSelectorField()
 
@@ -247,30 +404,40 @@ class Service(Model):
 
 
 class PersistentVolume(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "v1"
         kind = "PersistentVolume"
 
 
 class PersistentVolumeClaim(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "v1"
         kind = "PersistentVolumeClaim"
 
 
 class HorizontalPodAutoscaler(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "autoscaling/v2beta2"
         kind = "HorizontalPodAutoscaler"
 
 
 class CustomResourceDefinition(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "apiextensions.k8s.io/v1"
         kind = "CustomResourceDefinition"
 
 
 class PharosVariable(Model):
+    __slots__ = ()
+
     data = fields.JsonPathField(path="json")
 
     class Meta:
@@ -279,6 +446,8 @@ class PharosVariable(Model):
 
 
 class ServiceAccount(Model):
+    __slots__ = ()
+
     class Meta:
         api_version = "v1"
         kind = "ServiceAccount"
@@ -1,11 +1,15 @@
-import time
 import yaml
-from pydoc import locate
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from kubernetes.dynamic import exceptions as api_exceptions
 from pharos import iterator
 from pharos import exceptions
 from pharos import models
-from pharos import backend, jinja
+from pharos import backend
+from pharos import informer
+from pharos import fields
+from pharos import selectors
+from pharos import utils
 
 
 variable_spec = {
@@ -33,6 +37,21 @@ variable_spec = {
 }
 
 
+# field selectors every kind supports
+default_field_selectors = ("metadata.name", "metadata.namespace")
+
+# list object metadata only, servers without support answer with full objects
+metadata_accept = (
+    "application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1,application/json"
+)
+
+# list options per consistency level, "cached" lets the api server answer from its
+# watch cache instead of a quorum read from etcd
+consistency_levels = {"strong": {}, "cached": {"resource_version": "0"}}
+
+BulkResult = namedtuple("BulkResult", ["item", "instance", "error"])
+
+
 class QuerySet:
     """Represent a lazy database lookup for a set of objects."""
 
@@ -42,7 +61,15 @@ class QuerySet:
         self._result_cache = None
         self._query = []
         self.api_kwargs = {}
+        self._fanout_selectors = []
         self._limit = None
+        self._clients = None
+        self.errors = {}
+        self._prefetch_related = ()
+        self._prefetched = None
+        self._projection = None
+        self._metadata_only = False
+        self._consistency = "strong"
 
     @property
     def query(self):
@@ -52,6 +79,14 @@ class QuerySet:
         self._client = client
         return self
 
+    def across(self, clients):
+        """Run the query against several clients or context names concurrently.
+
+        Context names are resolved with the client passed to using().
+        """
+        self._clients = list(clients)
+        return self
+
     def filter(self, **kwargs):
         clone = self._clone()
         for k, v in kwargs.items():
@@ -68,11 +103,84 @@ class QuerySet:
     def all(self):
         return self._clone()
 
+    def values(self, *names):
+        """Yield a dict of the given field values per object instead of models."""
+        return self._project("values", names or ("name", "namespace"))
+
+    def values_list(self, *names, flat=False):
+        if flat and len(names) != 1:
+            raise TypeError("flat is only valid with a single field.")
+        return self._project("flat" if flat else "values_list", names)
+
+    def only(self, *names):
+        """Models keeping only the paths of the given fields, name and namespace."""
+        return self._project("only", ("name", "namespace") + names)
+
+    def metadata_only(self):
+        """List object metadata only (PartialObjectMetadataList), spec and status are empty."""
+        clone = self._clone()
+        clone._metadata_only = True
+        return clone
+
+    def consistency(self, level):
+        """Read with "strong" (quorum, the default) or "cached" consistency.
+
+        Cached reads may be slightly stale.
+        """
+        if level not in consistency_levels:
+            raise ValueError(
+                f"consistency must be one of {', '.join(consistency_levels)}"
+            )
+        clone = self._clone()
+        clone._consistency = level
+        return clone
+
+    def _project(self, kind, names):
+        projected = []
+        for name in names:
+            field = getattr(self.model, name, None)
+            if not isinstance(field, fields.QueryField):
+                raise exceptions.FieldDoesNotExist(f"{name} not exist")
+            projected.append(field)
+        clone = self._clone()
+        clone._projection = (kind, names, projected)
+        return clone
+
+    def _build(self, obj):
+        if self._projection is None:
+            return self.model(client=self._client, k8s_object=obj)
+
+        kind, names, projected = self._projection
+        if kind == "only":
+            obj = fields.prune_paths(obj, [i.keys for i in projected])
+            return self.model(client=self._client, k8s_object=obj)
+        values = tuple(i.get_value(obj) for i in projected)
+        if kind == "values":
+            return dict(zip(names, values))
+        if kind == "flat":
+            return values[0]
+        return values
+
+    def prefetch_related(self, *names):
+        """List the kinds behind these related fields once per namespace,
+        related querysets of the results are then answered from memory.
+        """
+        clone = self._clone()
+        clone._prefetch_related = clone._prefetch_related + names
+        return clone
+
     def get(self, **kwargs):
         clone = self.filter(**kwargs)
-        num = len(clone)
+        return clone._get_one(list(clone))
+
+    async def aget(self, **kwargs):
+        clone = self.filter(**kwargs)
+        return clone._get_one([i async for i in clone])
+
+    def _get_one(self, result):
+        num = len(result)
         if num == 1:
-            return clone._result_cache[0]
+            return result[0]
         if not num:
             raise exceptions.ObjectDoesNotExist(
                 f"{self.model.Meta.kind} matching result does not exist."
@@ -82,69 +190,143 @@ class QuerySet:
         )
 
     def _create_variable_crd(self):
+        if self._client.variable_crd_ready:
+            return
         try:
-            models.CustomResourceDefinition.objects.using(self._client).create(
+            crd = models.CustomResourceDefinition.objects.using(self._client).create(
                 "variable_crd.yaml", {}, internal=True
             )
-            time.sleep(0.1)
+            if is_established(crd.k8s_object):
+                self._client.variable_crd_ready = True
+                return
         except api_exceptions.ConflictError:
             pass
+        self._wait_variable_crd()
 
-    def render(self, template, variables, namespace=None):
+    def _wait_variable_crd(self):
+        # variables can not be created before the new crd is served
+        api_spec = self._client.get_resource(
+            "apiextensions.k8s.io/v1", "CustomResourceDefinition"
+        )
+        for event in api_spec.watch(
+            name=variable_spec["metadata"]["name"],
+            timeout=self._client.settings.crd_established_timeout,
+        ):
+            if is_established(event["raw_object"]):
+                self._client.variable_crd_ready = True
+                return
+
+        # the watch timed out, the event may have been missed
+        name = variable_spec["metadata"]["name"]
+        if is_established(api_spec.get(name=name).to_dict()):
+            self._client.variable_crd_ready = True
+            return
+        raise exceptions.CrdNotEstablished(
+            f"{name} is not established after "
+            f"{self._client.settings.crd_established_timeout}s"
+        )
+
+    def _render(self, namespace, template, variables, internal=False):
         template_backend = backend.TemplateBackend()
-        engine = locate(self._client.settings.template_engine)(self._client)
-        template_backend.set_engine(engine)
-        json_spec = template_backend.render(namespace, template, variables, False)
+        template_backend.set_engine(self._client.get_engine(internal))
+        template_backend.set_cache(self._client.get_render_cache())
+        template_backend.with_hash = self._client.settings.skip_unchanged
+        return template_backend.render(namespace, template, variables, internal)
+
+    def render(self, template, variables, namespace=None):
+        json_spec = self._render(namespace, template, variables)
         print(yaml.dump(json_spec, default_flow_style=False))
 
     def create(
         self, template, variables, internal=False, dry_run=False, namespace=None
     ):
-        template_backend = backend.TemplateBackend()
-        if internal:
-            engine = jinja.JinjaEngine(self._client, internal=True)
-        else:
-            engine = locate(self._client.settings.template_engine)(self._client)
-        template_backend.set_engine(engine)
-        json_spec = template_backend.render(namespace, template, variables, internal)
+        json_spec = self._render(namespace, template, variables, internal)
+        self._check_kind(json_spec)
+
+        instance = self._create(json_spec, namespace, dry_run)
+        if internal or dry_run:
+            return instance
 
+        self._create_variable_crd()
+        self._create_variable(instance, variables, namespace)
+        return instance
+
+    def bulk_create(self, items, concurrency=10, dry_run=False):
+        """Create (template, variables, namespace) items, at most concurrency at a time.
+
+        Concurrency is capped at the connection pool size of the client. Return
+        a BulkResult per item in the given order, failed items have error set
+        instead of raising.
+        """
+        items = [tuple(i) for i in items]
+        results = [None] * len(items)
+        rendered = []
+        for index, (template, variables, namespace) in enumerate(items):
+            try:
+                json_spec = self._render(namespace, template, variables)
+                self._check_kind(json_spec)
+            except Exception as e:
+                results[index] = BulkResult(items[index], None, e)
+                continue
+            rendered.append((index, json_spec))
+
+        if rendered and not dry_run:
+            try:
+                self._create_variable_crd()
+            except Exception as e:
+                # no variable can be stored, don't create anything
+                for index, _ in rendered:
+                    results[index] = BulkResult(items[index], None, e)
+                return results
+
+        def submit(index, json_spec):
+            template, variables, namespace = items[index]
+            try:
+                instance = self._create(json_spec, namespace, dry_run)
+                if not dry_run:
+                    self._create_variable(instance, variables, namespace)
+            except Exception as e:
+                return BulkResult(items[index], None, e)
+            return BulkResult(items[index], instance, None)
+
+        # more workers than pooled connections would only open throwaway ones
+        pool_size = getattr(
+            self._client.k8s_client.configuration, "connection_pool_maxsize", None
+        )
+        if isinstance(pool_size, int) and pool_size > 0:
+            concurrency = min(concurrency, pool_size)
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            futures = [(i, executor.submit(submit, i, spec)) for i, spec in rendered]
+            for index, future in futures:
+                results[index] = future.result()
+        return results
+
+    def _check_kind(self, json_spec):
         if json_spec["kind"] != self.model.Meta.kind:
             raise exceptions.ResourceNotMatch(
                 f'{json_spec["kind"]} does not match {self.model.Meta.kind}!'
             )
 
-        client = self._client.dynamic_client
-        api_spec = client.resources.get(
-            api_version=self.model.Meta.api_version, kind=self.model.Meta.kind
+    def _create(self, json_spec, namespace, dry_run=False):
+        api_spec = self._client.get_resource(
+            self.model.Meta.api_version, self.model.Meta.kind
         )
 
-        if dry_run:
-            response = api_spec.create(
-                body=json_spec,
-                namespace=namespace
-                or json_spec["metadata"].get("namespace")
-                or "default",
-                query_params=[("dryRun", "All")],
-            )
-            instance = self.model(client=self._client, k8s_object=response.to_dict())
-            return instance
-
+        kwargs = {"query_params": [("dryRun", "All")]} if dry_run else {}
         response = api_spec.create(
             body=json_spec,
             namespace=namespace or json_spec["metadata"].get("namespace") or "default",
+            **kwargs,
         )
-        instance = self.model(client=self._client, k8s_object=response.to_dict())
-        if internal:
-            return instance
+        return self.model(client=self._client, k8s_object=response.to_dict())
 
-        self._create_variable_crd()
+    def _create_variable(self, instance, variables, namespace):
         models.PharosVariable.objects.using(self._client).create(
             "variables.yaml",
             {"name": instance.variable_name, "value": variables},
             internal=True,
             namespace=namespace,
         )
-        return instance
 
     def _update(
         self,
@@ -154,32 +336,78 @@ class QuerySet:
         resource_version,
         internal=False,
         dry_run=False,
+        previous=None,
+        skip_hash=None,
     ):
-        template_backend = backend.TemplateBackend()
-        if internal:
-            engine = jinja.JinjaEngine(self._client, internal=True)
+        json_spec = self._render(namespace, template, variables, internal)
+        if skip_hash and self._spec_hash(json_spec) == skip_hash:
+            return None
+        api_spec = self._client.get_resource(
+            self.model.Meta.api_version, self.model.Meta.kind
+        )
+        namespace = namespace or json_spec["metadata"].get("namespace") or "default"
+        query_params = [("dryRun", "All")] if dry_run else []
+        strategy = "replace" if internal else self._client.settings.update_strategy
+
+        if strategy == "replace":
+            json_spec["metadata"]["resourceVersion"] = resource_version
+            response = api_spec.replace(
+                body=json_spec, namespace=namespace, query_params=query_params
+            )
+        elif strategy == "apply":
+            response = api_spec.server_side_apply(
+                body=json_spec,
+                namespace=namespace,
+                field_manager=self._client.settings.field_manager,
+                force_conflicts=self._client.settings.force_conflicts,
+                query_params=query_params,
+            )
+        elif strategy == "merge":
+            # previous is the spec rendered last time, without it nothing is removed
+            response = api_spec.patch(
+                body=utils.merge_patch(previous or {}, json_spec),
+                name=json_spec["metadata"]["name"],
+                namespace=namespace,
+                content_type="application/merge-patch+json",
+                query_params=query_params,
+            )
         else:
-            engine = locate(self._client.settings.template_engine)(self._client)
-        template_backend.set_engine(engine)
-        json_spec = template_backend.render(namespace, template, variables, internal)
+            raise ValueError(f"update_strategy: {strategy} is not supported!")
+
+        return response.to_dict()
+
+    async def _aupdate(
+        self,
+        namespace,
+        template,
+        variables,
+        resource_version,
+        internal=False,
+        dry_run=False,
+        skip_hash=None,
+    ):
+        json_spec = self._render(namespace, template, variables, internal)
+        if skip_hash and self._spec_hash(json_spec) == skip_hash:
+            return None
         json_spec["metadata"]["resourceVersion"] = resource_version
-        client = self._client.dynamic_client
-        api_spec = client.resources.get(
-            api_version=self.model.Meta.api_version, kind=self.model.Meta.kind
+        api_spec = await self._client.get_resource(
+            self.model.Meta.api_version, self.model.Meta.kind
         )
         query_params = [("dryRun", "All")] if dry_run else []
-        response = api_spec.replace(
+        return await api_spec.replace(
             body=json_spec,
             namespace=namespace or json_spec["metadata"].get("namespace") or "default",
             query_params=query_params,
         )
 
-        return response.to_dict()
+    @staticmethod
+    def _spec_hash(json_spec):
+        annotations = json_spec["metadata"].get("annotations") or {}
+        return annotations.get(f"{backend.TemplateBackend.prefix}/hash")
 
     def delete(self, name, namespace=None):
-        client = self._client.dynamic_client
-        api_spec = client.resources.get(
-            api_version=self.model.Meta.api_version, kind=self.model.Meta.kind
+        api_spec = self._client.get_resource(
+            self.model.Meta.api_version, self.model.Meta.kind
         )
         return api_spec.delete(name, namespace)
 
@@ -200,11 +428,94 @@ class QuerySet:
 
         return iter(self._result_cache)
 
-    def _get_result(self):
-        client = self._client.dynamic_client
+    def __aiter__(self):
+        self._check_client()
+        return self._aiterate()
+
+    async def acount(self):
+        count = 0
+        async for _ in self:
+            count += 1
+        return count
+
+    def count(self):
+        """Count matching objects, downloading as little as the query allows."""
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        self._check_client()
+        if self._clients is not None:
+            return len(self._across())
+
+        post_lookups = self._prepare()
+        if (
+            post_lookups
+            or self._use_informer(self.api_kwargs)
+            or self._prefetched_key(self.api_kwargs)
+        ):
+            return sum(1 for _ in self._iterate())
+        try:
+            total = sum(self._count(i) for i in self._fanout())
+        except api_exceptions.NotFoundError:
+            return 0
+        return total if self._limit is None else min(total, self._limit)
+
+    def exists(self):
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        self._check_client()
+        if self._clients is not None:
+            return bool(self._across())
+
+        post_lookups = self._prepare()
+        if (
+            post_lookups
+            or self._use_informer(self.api_kwargs)
+            or self._prefetched_key(self.api_kwargs)
+        ):
+            return next(self._iterate(), None) is not None
+        try:
+            return any(self._count(i, exact=False) for i in self._fanout())
+        except api_exceptions.NotFoundError:
+            return False
 
+    def _count(self, api_kwargs, exact=True):
+        api_spec = self._client.get_resource(
+            self.model.Meta.api_version, self.model.Meta.kind
+        )
+        response = iterator.SimpleIterator(self._client, api_spec).request(
+            **api_kwargs, limit=1
+        )
+        if "items" not in response:
+            return 1  # get by name
+
+        metadata = response["metadata"]
+        remaining = metadata.get("remainingItemCount")
+        count = len(response["items"])
+        # a list served from the watch cache (resourceVersion=0) may ignore
+        # limit, then the response already holds every item
+        if count > 1 or not metadata.get("continue"):
+            return count
+        if not exact or remaining is not None:
+            return count + (remaining or 0)
+
+        # remainingItemCount is not set for selector queries, page through metadata
+        headers = dict(api_kwargs.get("header_params") or {})
+        headers["Accept"] = metadata_accept
+        api = iterator.ChunkIterator(self._client, api_spec)
+        return sum(1 for _ in api.get(**dict(api_kwargs, header_params=headers)))
+
+    def iterator(self):
+        """Yield model instances page by page, without filling the result cache."""
+        self._check_client()
+        if self._clients is not None:
+            return iter(self._across())
+        return self._iterate()
+
+    def _prepare(self):
+        self.api_kwargs = {}
         if self._client.settings.disable_compress is False:
             self.api_kwargs["header_params"] = {"Accept-Encoding": "gzip"}
+        self.api_kwargs.update(consistency_levels[self._consistency])
 
         pre_lookups = []
         post_lookups = []
@@ -221,9 +532,120 @@ class QuerySet:
 
         for lookup in pre_lookups:
             lookup["lookup"].update_queryset(self, lookup["rhs"])
+        # lookups pushed down to the server do not need the full object
+        post_lookups = self._pushdown(post_lookups)
+        if self._use_metadata(post_lookups):
+            headers = self.api_kwargs.setdefault("header_params", {})
+            headers["Accept"] = metadata_accept
+        return post_lookups
+
+    def _use_metadata(self, post_lookups):
+        if self._metadata_only:
+            return True
+        # projections know every field they read
+        if self._projection is None:
+            return False
+        used = self._projection[2] + [i["field"] for i in post_lookups]
+        return all(i.metadata_only for i in used)
+
+    def _pushdown(self, post_lookups):
+        """Turn post lookups into field selectors where the API supports them."""
+        self._fanout_selectors = []
+        if not self._client.settings.field_selector_pushdown:
+            return post_lookups
+
+        supported = set(default_field_selectors)
+        supported.update(getattr(self.model.Meta, "field_selectors", ()))
+        remaining = []
+        for lookup in post_lookups:
+            keys = lookup["field"].keys
+            path = ".".join(keys) if keys else None
+            terms = None
+            if path in supported:
+                terms = lookup["lookup"].field_selector(path, lookup["rhs"])
+
+            if not terms:
+                remaining.append(lookup)
+            elif len(terms) == 1:
+                self._add_field_selector(self.api_kwargs, terms[0])
+            elif (
+                not self._fanout_selectors
+                and len(terms) <= self._client.settings.pushdown_in_limit
+            ):
+                # one list call per value, field selectors have no set operator
+                self._fanout_selectors = terms
+            else:
+                remaining.append(lookup)
+        return remaining
+
+    @staticmethod
+    def _add_field_selector(api_kwargs, term):
+        if "field_selector" in api_kwargs:
+            api_kwargs["field_selector"] += f",{term}"
+        else:
+            api_kwargs["field_selector"] = term
+
+    def _fanout(self):
+        if not self._fanout_selectors:
+            yield self.api_kwargs
+        for term in self._fanout_selectors:
+            api_kwargs = dict(self.api_kwargs)
+            self._add_field_selector(api_kwargs, term)
+            yield api_kwargs
+
+    def _source(self):
+        if not self._fanout_selectors:
+            return self._list(self.api_kwargs)
+
+        def fanout():
+            for api_kwargs in self._fanout():
+                yield from self._list(api_kwargs)
 
-        api_spec = client.resources.get(
-            api_version=self.model.Meta.api_version, kind=self.model.Meta.kind
+        return fanout()
+
+    async def _asource(self):
+        api_spec = await self._client.get_resource(
+            self.model.Meta.api_version, self.model.Meta.kind
+        )
+
+        iterator_class = iterator.AsyncSimpleIterator
+        if self._client.settings.enable_chunk:
+            iterator_class = iterator.AsyncChunkIterator
+
+        api = iterator_class(self._client, api_spec)
+        for api_kwargs in self._fanout():
+            async for obj in api.get(**api_kwargs):
+                yield obj
+
+    def _prefetched_key(self, api_kwargs):
+        """Key of the prefetched objects that answer api_kwargs, if any."""
+        if self._prefetched is None or not informer.Informer.can_serve(api_kwargs):
+            return None
+        key = (
+            self.model.Meta.api_version,
+            self.model.Meta.kind,
+            api_kwargs.get("namespace"),
+        )
+        return key if key in self._prefetched else None
+
+    def _list(self, api_kwargs):
+        key = self._prefetched_key(api_kwargs)
+        if key is not None:
+            kwargs = {
+                k: v
+                for k, v in api_kwargs.items()
+                if k not in informer.Informer.ignored_kwargs
+            }
+            return [i for i in self._prefetched[key] if selectors.match(i, **kwargs)]
+
+        if self._use_informer(api_kwargs):
+            cache = self._client.get_informer(
+                self.model.Meta.api_version, self.model.Meta.kind
+            )
+            return cache.list(**api_kwargs)
+
+        api_spec = self._client.get_resource(
+            self.model.Meta.api_version, self.model.Meta.kind
         )
 
         iterator_class = iterator.SimpleIterator
@@ -231,36 +653,123 @@ class QuerySet:
             iterator_class = iterator.ChunkIterator
 
         api = iterator_class(self._client, api_spec)
-        result = api.get(**self.api_kwargs)
-        self._result_cache = result
-
-        final = []
-        for obj in result:
-            valid = True
-            for lookup in post_lookups:
-                try:
-                    value = lookup["field"].get_value(obj)
-                    lookup["lookup"].validate(value, lookup["rhs"])
-                except exceptions.ValidationError:
-                    valid = False
-                    break
-
-            if valid is True:
-                final.append(obj)
-            if len(final) == self._limit:
-                break
-
-        self._result_cache = [
-            self.model(client=self._client, k8s_object=i) for i in final
-        ]
+        return api.get(**api_kwargs)
+
+    @staticmethod
+    def _match(obj, post_lookups):
+        for lookup in post_lookups:
+            try:
+                value = lookup["field"].get_value(obj)
+                lookup["lookup"].validate(value, lookup["rhs"])
+            except exceptions.ValidationError:
+                return False
+        return True
+
+    def _iterate(self):
+        post_lookups = self._prepare()
+        count = 0
+        for obj in self._source():
+            if not self._match(obj, post_lookups):
+                continue
+            yield self._build(obj)
+            count += 1
+            if count == self._limit:
+                return
+
+    async def _aiterate(self):
+        post_lookups = self._prepare()
+        count = 0
+        async for obj in self._asource():
+            if not self._match(obj, post_lookups):
+                continue
+            yield self._build(obj)
+            count += 1
+            if count == self._limit:
+                return
+
+    def _get_result(self):
+        if self._clients is not None:
+            self._result_cache = self._across()
+        else:
+            self._result_cache = list(self._iterate())
+        projection = self._projection and self._projection[0]
+        if self._prefetch_related and projection in (None, "only"):
+            self._prefetch(self._result_cache)
         return self._result_cache
 
-    def _fetch_all(self):
-        if not self._client:
+    def _prefetch(self, instances):
+        related = []
+        for name in self._prefetch_related:
+            field = getattr(self.model, name, None)
+            if not isinstance(field, fields.RelatedField):
+                raise exceptions.FieldDoesNotExist(f"{name} is not a related field")
+            related.extend(field.related_models)
+
+        # across() mixes clusters, each lists related objects with its own client
+        groups = {}
+        for instance in instances:
+            groups.setdefault(id(instance._client), []).append(instance)
+        for group in groups.values():
+            client = group[0]._client
+            store = {}
+            for model in related:
+                for namespace in {i.namespace for i in group}:
+                    key = (model.Meta.api_version, model.Meta.kind, namespace)
+                    if key in store:
+                        continue
+                    queryset = model.objects.using(client).consistency(
+                        self._consistency
+                    )
+                    if namespace:
+                        queryset = queryset.filter(namespace=namespace)
+                    store[key] = [i.k8s_object.data for i in queryset]
+            for instance in group:
+                instance._prefetched = store
+
+    def _across(self):
+        clients = list(self._clients)
+        if not self._client and any(isinstance(i, str) for i in clients):
+            raise exceptions.ClientNotSet(
+                "Context names need a client, adding .using(client) to your query."
+            )
+
+        def fetch(client):
+            if isinstance(client, str):
+                client = self._client.get_context_client(client)
+            clone = self._clone()
+            clone._clients = None
+            clone._client = client
+            return list(clone._iterate())
+
+        self.errors = {}
+        if not clients:
+            return []
+        with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+            futures = [(i, executor.submit(fetch, i)) for i in clients]
+
+        # one failing cluster does not abort the others, see .errors
+        result = []
+        for client, future in futures:
+            try:
+                result.extend(future.result())
+            except Exception as e:
+                self.errors[client] = e
+        return result[: self._limit]
+
+    def _use_informer(self, api_kwargs):
+        enabled = getattr(self.model.Meta, "informer", None)
+        if enabled is None:
+            enabled = self._client.settings.enable_informer
+        return enabled and informer.Informer.can_serve(api_kwargs)
+
+    def _check_client(self):
+        if not self._client and not self._clients:
             raise exceptions.ClientNotSet(
                 "Client not set yet, adding .using(client) to your query."
             )
 
+    def _fetch_all(self):
+        self._check_client()
         if self._result_cache is None:
             self._get_result()
 
@@ -279,6 +788,20 @@ class QuerySet:
             model=self.model,
             using=self._client,
         )
-        c._query = self._query
+        c._query = list(self._query)
         c._limit = self._limit
+        c._clients = self._clients
+        c._prefetch_related = self._prefetch_related
+        c._prefetched = self._prefetched
+        c._projection = self._projection
+        c._metadata_only = self._metadata_only
+        c._consistency = self._consistency
         return c
+
+
+def is_established(crd):
+    conditions = (crd.get("status") or {}).get("conditions") or []
+    return any(
+        i.get("type") == "Established" and i.get("status") == "True"
+        for i in conditions
+    )
@@ -0,0 +1,125 @@
+import re
+
+
+SET_BASED = re.compile(r"^(\S+)\s+(in|notin)\s*\((.*)\)$", re.IGNORECASE)
+EXISTS = re.compile(r"^(\S+)\s+(exists|doesnotexist)\s*\(?\s*\)?$", re.IGNORECASE)
+EQUALITY = re.compile(r"^([^!=\s]+)\s*(==|=|!=)\s*(.*)$")
+
+
+def split_terms(selector):
+    terms = []
+    depth = 0
+    current = ""
+    escaped = False
+    for char in selector:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0 and not escaped:
+            terms.append(current.strip())
+            current = ""
+            continue
+        escaped = char == "\\" and not escaped
+        current += char
+    terms.append(current.strip())
+    return [i for i in terms if i]
+
+
+def parse_values(values):
+    return {i.strip().strip("'\"") for i in values.split(",") if i.strip()}
+
+
+def parse_label_selector(selector):
+    requirements = []
+    for term in split_terms(selector):
+        match = SET_BASED.match(term)
+        if match:
+            key, op, values = match.groups()
+            requirements.append((key, op.lower(), parse_values(values)))
+            continue
+        match = EXISTS.match(term)
+        if match:
+            key, op = match.groups()
+            op = "exists" if op.lower() == "exists" else "!"
+            requirements.append((key, op, None))
+            continue
+        match = EQUALITY.match(term)
+        if match:
+            key, op, value = match.groups()
+            op = "=" if op == "==" else op
+            requirements.append((key, op, value.strip()))
+            continue
+        if term.startswith("!"):
+            requirements.append((term[1:].strip(), "!", None))
+        elif re.match(r"^\S+$", term):
+            requirements.append((term, "exists", None))
+        else:
+            raise ValueError(f"Label selector: {term} is not supported!")
+    return requirements
+
+
+def parse_field_selector(selector):
+    requirements = []
+    for term in split_terms(selector):
+        match = EQUALITY.match(term)
+        if not match:
+            raise ValueError(f"Field selector: {term} is not supported!")
+        path, op, value = match.groups()
+        op = "=" if op == "==" else op
+        requirements.append((path, op, re.sub(r"\\(.)", r"\1", value.strip())))
+    return requirements
+
+
+def match_labels(selector, labels):
+    labels = labels or {}
+    for key, op, value in parse_label_selector(selector):
+        if op == "exists" and key not in labels:
+            return False
+        if op == "!" and key in labels:
+            return False
+        if op == "in" and labels.get(key) not in value:
+            return False
+        if op == "notin" and labels.get(key) in value:
+            return False
+        if op == "=" and labels.get(key) != value:
+            return False
+        if op == "!=" and labels.get(key) == value:
+            return False
+    return True
+
+
+def field_value(obj, path):
+    value = obj
+    for key in path.split("."):
+        try:
+            value = value[key]
+        except (KeyError, TypeError):
+            return ""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def match_fields(selector, obj):
+    for path, op, value in parse_field_selector(selector):
+        if op == "=" and field_value(obj, path) != value:
+            return False
+        if op == "!=" and field_value(obj, path) == value:
+            return False
+    return True
+
+
+def match(obj, name=None, namespace=None, label_selector=None, field_selector=None):
+    metadata = obj.get("metadata") or {}
+    if name is not None and metadata.get("name") != name:
+        return False
+    if namespace is not None and metadata.get("namespace") != namespace:
+        return False
+    if label_selector and not match_labels(label_selector, metadata.get("labels")):
+        return False
+    if field_selector and not match_fields(field_selector, obj):
+        return False
+    return True
@@ -1,10 +1,59 @@
-from collections import UserDict
+import json
+from collections.abc import Mapping
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def merge_patch(source, target):
+    """JSON merge patch (RFC 7386) turning source into target."""
+    if not isinstance(source, dict) or not isinstance(target, dict):
+        return target
+    patch = {key: None for key in source if key not in target}
+    for key, value in target.items():
+        if key not in source:
+            patch[key] = value
+        elif source[key] != value:
+            patch[key] = merge_patch(source[key], value)
+    return patch
+
+
+class ReadOnlyDict(Mapping):
+    """Read-only view of a dict, the data is not copied."""
+
+    __slots__ = ("data",)
 
-class ReadOnlyDict(UserDict):
     def __init__(self, data):
+        if isinstance(data, ReadOnlyDict):
+            data = data.data
         self.data = data
 
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __repr__(self):
+        return repr(self.data)
+
+    def copy(self):
+        return dict(self.data)
+
     def __setitem__(self, key, value):
         raise TypeError("readonly dict")
 
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import os
+import tempfile
+from unittest import TestCase, skipIf
+from jinja2 import PackageLoader
+from kubernetes.dynamic import exceptions as api_exceptions
+from pharos import models, selectors
+from pharos.client import AsyncClient, aiohttp
+
+if aiohttp:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+
+
+RESOURCES = {
+    "v1": [{"name": "pods", "kind": "Pod", "namespaced": True}],
+    "apps/v1": [
+        {"name": "deployments", "kind": "Deployment", "namespaced": True},
+        {"name": "deployments/status", "kind": "Deployment", "namespaced": True},
+    ],
+    "pharos.py/v1": [{"name": "variables", "kind": "Variable", "namespaced": False}],
+}
+
+
+class AppsDeployment(models.Deployment):
+    class Meta:
+        api_version = "apps/v1"
+        kind = "Deployment"
+
+
+class FakeApiServer:
+    """In-memory api server, enough for list/get/replace through AsyncClient."""
+
+    def __init__(self):
+        self.store = {}
+        self.requests = []
+        self.version = 1
+
+    def add(self, resource, obj):
+        obj["metadata"]["resourceVersion"] = str(self.version)
+        self.version += 1
+        self.store[(resource, obj["metadata"]["name"])] = obj
+
+    def app(self):
+        app = web.Application()
+        for prefix in ("/api/{version}", "/apis/{group}/{version}"):
+            app.router.add_get(prefix, self.discovery)
+            for scope in ("", "/namespaces/{namespace}"):
+                app.router.add_get(prefix + scope + "/{resource}", self.list)
+                app.router.add_get(prefix + scope + "/{resource}/{name}", self.get)
+                app.router.add_put(prefix + scope + "/{resource}/{name}", self.put)
+        return app
+
+    def log(self, request):
+        self.requests.append((request.method, request.path, dict(request.query)))
+        if request.headers.get("Authorization") != "Bearer secret":
+            raise web.HTTPUnauthorized()
+
+    async def discovery(self, request):
+        self.log(request)
+        info = request.match_info
+        key = "/".join(i for i in (info.get("group"), info["version"]) if i)
+        return web.json_response({"resources": RESOURCES[key]})
+
+    async def list(self, request):
+        self.log(request)
+        info, query = request.match_info, request.query
+        items = [
+            obj
+            for (resource, _), obj in sorted(self.store.items())
+            if resource == info["resource"]
+            and selectors.match(
+                obj,
+                namespace=info.get("namespace"),
+                label_selector=query.get("labelSelector"),
+                field_selector=query.get("fieldSelector"),
+            )
+        ]
+        start = int(query.get("continue", 0))
+        end = start + int(query.get("limit", len(items)))
+        metadata = {"continue": str(end)} if end < len(items) else {}
+        return web.json_response({"metadata": metadata, "items": items[start:end]})
+
+    async def get(self, request):
+        self.log(request)
+        info = request.match_info
+        obj = self.store.get((info["resource"], info["name"]))
+        if obj is None:
+            return web.json_response({"reason": "NotFound"}, status=404)
+        return web.json_response(obj)
+
+    async def put(self, request):
+        self.log(request)
+        info = request.match_info
+        body = await request.json()
+        current = self.store[(info["resource"], info["name"])]
+        if body["metadata"]["resourceVersion"] != current["metadata"]["resourceVersion"]:
+            return web.json_response({"reason": "Conflict"}, status=409)
+        self.add(info["resource"], body)
+        return web.json_response(body)
+
+
+def make_pod(name, namespace="default", app="nginx"):
+    return {
+        "kind": "Pod",
+        "metadata": {"name": name, "namespace": namespace, "labels": {"app": app}},
+    }
+
+
+@skipIf(aiohttp is None, "aiohttp is not installed")
+class AsyncQueryTestCase(TestCase):
+    def setUp(self):
+        self.server = FakeApiServer()
+        for i in range(5):
+            self.server.add("pods", make_pod(f"nginx-{i}"))
+        self.server.add("pods", make_pod("redis", app="redis"))
+        self.server.add("pods", make_pod("dns", namespace="kube-system"))
+
+    def run_with_client(self, scenario, **settings):
+        async def main():
+            server = TestServer(self.server.app(), host="127.0.0.1")
+            await server.start_server()
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "config")
+                with open(path, "w") as f:
+                    json.dump(self.kubeconfig(server.port), f)
+                try:
+                    async with AsyncClient(path, **settings) as client:
+                        return await scenario(client)
+                finally:
+                    await server.close()
+
+        return asyncio.run(main())
+
+    def kubeconfig(self, port):
+        return {
+            "apiVersion": "v1",
+            "kind": "Config",
+            "current-context": "test",
+            "clusters": [
+                {"name": "test", "cluster": {"server": f"http://127.0.0.1:{port}"}}
+            ],
+            "users": [{"name": "test", "user": {"token": "secret"}}],
+            "contexts": [
+                {"name": "test", "context": {"cluster": "test", "user": "test"}}
+            ],
+        }
+
+    def test_async_iterate(self):
+        async def scenario(client):
+            query = models.Pod.objects.using(client).filter(
+                namespace="default", selector="app=nginx"
+            )
+            return [pod.name async for pod in query]
+
+        names = self.run_with_client(scenario, chunk_size=2)
+        self.assertEqual(names, [f"nginx-{i}" for i in range(5)])
+        lists = [i for i in self.server.requests if i[1].endswith("/pods")]
+        self.assertEqual(
+            [i[2].get("continue") for i in lists], [None, "2", "4"]
+        )
+        self.assertEqual(lists[0][1], "/api/v1/namespaces/default/pods")
+        self.assertEqual(lists[0][2]["labelSelector"], "app=nginx")
+
+    def test_async_cached(self):
+        async def scenario(client):
+            query = models.Pod.objects.using(client).consistency("cached")
+            return [pod.name async for pod in query]
+
+        names = self.run_with_client(scenario, chunk_size=4)
+        self.assertEqual(len(names), 7)
+        lists = [i[2] for i in self.server.requests if i[1].endswith("/pods")]
+        self.assertEqual(
+            [(i.get("resourceVersion"), i.get("continue")) for i in lists],
+            [("0", None), (None, "4")],
+        )
+
+    def test_async_get_and_count(self):
+        async def scenario(client):
+            pod = await models.Pod.objects.using(client).aget(
+                name="redis", namespace="default"
+            )
+            count = await models.Pod.objects.using(client).all().acount()
+            limited = await models.Pod.objects.using(client).limit(3).acount()
+            with self.assertRaises(api_exceptions.NotFoundError):
+                await models.Pod.objects.using(client).aget(
+                    name="missing", namespace="default"
+                )
+            return pod, count, limited
+
+        pod, count, limited = self.run_with_client(scenario, enable_chunk=False)
+        self.assertEqual(pod.name, "redis")
+        self.assertEqual((count, limited), (7, 3))
+        # discovery is cached on the client
+        discovery = [i for i in self.server.requests if i[1] == "/api/v1"]
+        self.assertEqual(len(discovery), 1)
+
+    def test_async_deploy(self):
+        deployment = {
+            "kind": "Deployment",
+            "metadata": {
+                "name": "nginx-deployment",
+                "namespace": "default",
+                "annotations": {
+                    "pharos.py/template": "test.yaml",
+                    "pharos.py/variable": "deployment-nginx-deployment-default",
+                },
+            },
+        }
+        self.server.add("deployments", deployment)
+        self.server.add(
+            "variables",
+            {
+                "metadata": {"name": "deployment-nginx-deployment-default"},
+                "json": {"label_name": "foo"},
+            },
+        )
+
+        async def scenario(client):
+            instance = await AppsDeployment.objects.using(client).aget(
+                name="nginx-deployment", namespace="default"
+            )
+            instance.set_variable({"label_name": "bar"})
+            await instance.adeploy()
+            return instance
+
+        instance = self.run_with_client(
+            scenario, jinja_loader=PackageLoader("tests", "./")
+        )
+        self.assertEqual(instance.k8s_object["metadata"]["labels"]["bar"], "label")
+        stored = self.server.store[("deployments", "nginx-deployment")]
+        self.assertEqual(stored["metadata"]["labels"]["bar"], "label")
+        variable = self.server.store[("variables", "deployment-nginx-deployment-default")]
+        self.assertEqual(variable["json"], {"label_name": "bar"})
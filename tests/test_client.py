@@ -1,4 +1,8 @@
+import os
+import tempfile
 from unittest import TestCase, mock
+from jinja2 import PackageLoader
+from pharos import models
 from pharos.client import Client
 
 
@@ -17,3 +21,96 @@ class ClientTestCase(TestCase):
             mock.call.new_client_from_config("test", context="bar"),
         ]
         self.assertEqual(k8s_mock.config.method_calls, expected_calls)
+
+    @mock.patch("pharos.client.kubernetes")
+    def test_with_context(self, k8s_mock):
+        client = Client("test", context="foo", chunk_size=10)
+        other = client.with_context("bar")
+        self.assertEqual((client.context, other.context), ("foo", "bar"))
+        self.assertEqual(other.settings.chunk_size, 10)
+        self.assertEqual(
+            k8s_mock.config.method_calls[-1],
+            mock.call.new_client_from_config("test", context="bar"),
+        )
+
+    @mock.patch("pharos.client.kubernetes")
+    def test_change_context_stop_informers(self, k8s_mock):
+        client = Client("test", context="foo")
+        informer = mock.Mock()
+        client.informers[("v1", "Pod")] = informer
+        client.use_context("bar")
+        informer.stop.assert_called_once_with()
+        self.assertEqual(client.informers, {})
+
+    @mock.patch("pharos.client.time")
+    @mock.patch("pharos.client.kubernetes")
+    def test_resource_cache(self, k8s_mock, time_mock):
+        time_mock.monotonic.return_value = 100
+        client = Client("test", resource_cache_ttl=10)
+        resources = k8s_mock.dynamic.DynamicClient.return_value.resources
+        resources.get.side_effect = lambda **kwargs: kwargs["kind"]
+
+        self.assertEqual(client.get_resource("v1", "Pod"), "Pod")
+        self.assertEqual(client.get_resource("v1", "Pod"), "Pod")
+        self.assertEqual(client.get_resource("v1", "Node"), "Node")
+        self.assertEqual(resources.get.call_count, 2)
+
+        time_mock.monotonic.return_value = 111
+        client.get_resource("v1", "Pod")
+        self.assertEqual(resources.get.call_count, 3)
+
+        client.use_context("bar")
+        client.get_resource("v1", "Pod")
+        self.assertEqual(resources.get.call_count, 4)
+
+    @mock.patch("pharos.client.kubernetes")
+    def test_resource_cache_disabled(self, k8s_mock):
+        client = Client("test", resource_cache_ttl=0)
+        client.get_resource("v1", "Pod")
+        client.get_resource("v1", "Pod")
+        resources = k8s_mock.dynamic.DynamicClient.return_value.resources
+        self.assertEqual(resources.get.call_count, 2)
+
+    @mock.patch("pharos.client.kubernetes")
+    def test_discovery_cache_file(self, k8s_mock):
+        client = Client("test", context="foo")
+        client.dynamic_client
+        client = Client("test", context="foo", discovery_cache_dir="/tmp/pharos")
+        # discovery is lazy
+        self.assertEqual(k8s_mock.dynamic.DynamicClient.call_count, 1)
+        client.dynamic_client
+        client.dynamic_client
+        cache_file = k8s_mock.dynamic.DynamicClient.call_args[1]["cache_file"]
+        self.assertEqual(os.path.dirname(cache_file), "/tmp/pharos")
+        self.assertEqual(
+            k8s_mock.dynamic.DynamicClient.call_args_list,
+            [
+                mock.call(k8s_mock.config.new_client_from_config(), cache_file=None),
+                mock.call(k8s_mock.config.new_client_from_config(), cache_file=cache_file),
+            ],
+        )
+        client.use_context("bar")
+        self.assertNotEqual(client.discovery_cache_file, cache_file)
+
+    @mock.patch("pharos.client.kubernetes")
+    def test_engine_reused(self, k8s_mock):
+        with tempfile.TemporaryDirectory() as tmp:
+            client = Client(
+                "test",
+                jinja_loader=PackageLoader("tests", "./"),
+                template_cache_size=10,
+                template_bytecode_cache_dir=tmp,
+            )
+            engine = client.get_engine()
+            query = models.Deployment.objects.using(client)
+            for label in ("foo", "bar"):
+                spec = query._render("default", "test.yaml", {"label_name": label})
+                self.assertEqual(spec["metadata"]["labels"][label], "label")
+            self.assertIs(client.get_engine(), engine)
+            self.assertEqual(engine.env.cache.capacity, 10)
+            # compiled once, stored in the bytecode cache
+            self.assertEqual(len(os.listdir(tmp)), 1)
+
+            self.assertIsNot(client.get_engine(internal=True), engine)
+            client.settings["jinja_loader"] = PackageLoader("pharos", "templates")
+            self.assertIsNot(client.get_engine(), engine)
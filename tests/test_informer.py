@@ -0,0 +1,207 @@
+from unittest import TestCase, mock
+from kubernetes.client.rest import ApiException
+from pharos import informer, models, selectors
+from pharos.client import Client
+
+
+def make_pod(name, namespace="default", labels=None, phase="Running", version="1"):
+    return {
+        "metadata": {
+            "name": name,
+            "namespace": namespace,
+            "labels": labels or {},
+            "resourceVersion": version,
+        },
+        "status": {"phase": phase},
+    }
+
+
+class SelectorTestCase(TestCase):
+    def test_label_selector(self):
+        labels = {"app": "nginx", "tier": "web"}
+        cases = [
+            ("app=nginx", True),
+            ("app==nginx,tier=web", True),
+            ("app!=nginx", False),
+            ("app in (nginx, redis)", True),
+            ("app notin (nginx)", False),
+            ("tier", True),
+            ("!tier", False),
+            ("app In ('nginx', 'redis')", True),
+            ("version Exists ()", False),
+            ("version DoesNotExist ()", True),
+        ]
+        for selector, expected in cases:
+            with self.subTest(selector=selector):
+                self.assertEqual(selectors.match_labels(selector, labels), expected)
+
+    def test_field_selector(self):
+        pod = make_pod("foo", phase="Pending")
+        pod["spec"] = {"hostNetwork": False}
+        self.assertTrue(selectors.match_fields("status.phase=Pending", pod))
+        self.assertTrue(selectors.match_fields("status.phase!=Running", pod))
+        self.assertTrue(selectors.match_fields("spec.hostNetwork=false", pod))
+        self.assertFalse(selectors.match_fields("metadata.name=bar", pod))
+        with self.assertRaises(ValueError):
+            selectors.parse_field_selector("metadata.name")
+
+
+class InformerTestCase(TestCase):
+    def setUp(self):
+        self.api_spec = mock.Mock()
+        with mock.patch("pharos.client.kubernetes"):
+            self.client = Client("test", chunk_size=2)
+
+    def test_relist(self):
+        responses = [
+            {
+                "metadata": {"continue": "1", "resourceVersion": "10"},
+                "items": [make_pod("a"), make_pod("b", namespace="kube-system")],
+            },
+            {
+                "metadata": {"resourceVersion": "10"},
+                "items": [make_pod("c", labels={"app": "nginx"})],
+            },
+        ]
+        self.api_spec.get.return_value.to_dict.side_effect = responses
+        cache = informer.Informer(self.client, self.api_spec)
+        cache.relist()
+        self.assertEqual(
+            self.api_spec.method_calls,
+            [
+                mock.call.get(limit=2, _continue=None),
+                mock.call.get(limit=2, _continue="1"),
+            ],
+        )
+        self.assertEqual(cache.resource_version, "10")
+        self.assertEqual(len(cache.list()), 3)
+        self.assertEqual(len(cache.list(namespace="default")), 2)
+        self.assertEqual(
+            [i["metadata"]["name"] for i in cache.list(label_selector="app=nginx")],
+            ["c"],
+        )
+
+    def test_handle_events(self):
+        cache = informer.Informer(self.client, self.api_spec)
+        cache.handle("ADDED", make_pod("a", version="11"))
+        cache.handle("MODIFIED", make_pod("a", phase="Failed", version="12"))
+        cache.handle("ADDED", make_pod("b", version="13"))
+        cache.handle("DELETED", make_pod("b", version="14"))
+        cache.handle("BOOKMARK", {"metadata": {"resourceVersion": "15"}})
+        self.assertEqual(cache.resource_version, "15")
+        self.assertEqual(
+            cache.list(), [make_pod("a", phase="Failed", version="12")]
+        )
+
+    def test_resume_and_relist_on_gone(self):
+        cache = informer.Informer(self.client, self.api_spec)
+        cache.resource_version = "5"
+        self.api_spec.get.return_value.to_dict.return_value = {
+            "metadata": {"resourceVersion": "20"},
+            "items": [make_pod("a", version="20")],
+        }
+
+        def watch(**kwargs):
+            calls.append(kwargs["resource_version"])
+            if len(calls) == 1:
+                yield {"type": "ADDED", "raw_object": make_pod("b", version="6")}
+            elif len(calls) == 2:
+                raise ApiException(status=410)
+            else:
+                cache.stop()
+                yield {"type": "ADDED", "raw_object": make_pod("c", version="21")}
+
+        calls = []
+        self.api_spec.watch.side_effect = watch
+        cache._run()
+        # resume from the last seen version, relist after 410 Gone
+        self.assertEqual(calls, ["5", "6", "20"])
+        self.assertEqual([i["metadata"]["name"] for i in cache.list()], ["a"])
+
+    def test_error_events(self):
+        cache = informer.Informer(self.client, self.api_spec)
+        cache.resource_version = "5"
+        self.api_spec.get.return_value.to_dict.return_value = {
+            "metadata": {"resourceVersion": "20"},
+            "items": [make_pod("a", version="20")],
+        }
+        expired = {"kind": "Status", "code": 410, "message": "too old"}
+        failed = {"kind": "Status", "code": 500, "message": "etcd"}
+
+        def watch(**kwargs):
+            calls.append(kwargs["resource_version"])
+            if len(calls) == 1:
+                yield {"type": "ERROR", "raw_object": failed}
+            elif len(calls) == 2:
+                yield {"type": "ERROR", "raw_object": expired}
+            else:
+                cache.stop()
+                yield {"type": "ADDED", "raw_object": make_pod("b", version="21")}
+
+        calls = []
+        self.api_spec.watch.side_effect = watch
+        with mock.patch.object(cache._stopped, "wait") as wait, self.assertLogs(
+            "pharos.informer", "WARNING"
+        ):
+            cache._run()
+        # other errors back off and resume, 410 relists
+        wait.assert_called_once_with(1)
+        self.assertEqual(calls, ["5", "5", "20"])
+        self.assertEqual([i["metadata"]["name"] for i in cache.list()], ["a"])
+
+    def test_stop_closes_watch(self):
+        cache = informer.Informer(self.client, self.api_spec)
+
+        def watch(watcher, **kwargs):
+            cache.stop()
+            self.assertTrue(watcher._stop)
+            yield {"type": "ADDED", "raw_object": make_pod("a")}
+
+        self.api_spec.watch.side_effect = watch
+        cache._run()
+        self.assertEqual(cache.list(), [])
+
+
+class InformerQueryTestCase(TestCase):
+    def setUp(self):
+        self.dynamic_client = mock.Mock()
+        with mock.patch("pharos.client.kubernetes"):
+            self.client = Client("test", enable_informer=True, disable_compress=True)
+        self.client.dynamic_client = self.dynamic_client
+        self.api_spec = self.dynamic_client.resources.get.return_value
+        self.api_spec.get.return_value.to_dict.return_value = {
+            "metadata": {"resourceVersion": "1"},
+            "items": [make_pod("a"), make_pod("b", namespace="kube-system")],
+        }
+
+    @mock.patch.object(informer.Informer, "_run")
+    def test_query_from_cache(self, run_mock):
+        for _ in range(3):
+            query = models.Pod.objects.using(self.client).filter(namespace="default")
+            self.assertEqual([i.name for i in query], ["a"])
+        # one list, every query after that is answered from memory
+        self.assertEqual(self.api_spec.get.call_count, 1)
+        self.assertEqual(run_mock.call_count, 1)
+
+    @mock.patch.object(informer.Informer, "_run")
+    def test_fallback_to_api(self, run_mock):
+        self.client.settings["enable_informer"] = False
+        len(models.Pod.objects.using(self.client).filter(namespace="default"))
+        self.assertEqual(
+            self.api_spec.method_calls,
+            [mock.call.get(_continue=None, limit=200, namespace="default")],
+        )
+        self.assertEqual(self.client.informers, {})
+
+    @mock.patch.object(informer.Informer, "_run")
+    def test_list_outside_client_lock(self, run_mock):
+        def get(**kwargs):
+            # another kind can be looked up while this one lists
+            self.assertFalse(self.client._informer_lock.locked())
+            return response
+
+        response = self.api_spec.get.return_value
+        self.api_spec.get.side_effect = get
+        first = self.client.get_informer("v1", "Pod")
+        self.assertIs(self.client.get_informer("v1", "Pod"), first)
+        self.assertEqual(self.api_spec.get.call_count, 1)
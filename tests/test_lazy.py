@@ -0,0 +1,72 @@
+import json
+from unittest import TestCase
+from pharos import lazy
+
+
+def item_dict(item):
+    return {key: item[key] for key in item}
+
+
+class LazyTestCase(TestCase):
+    cases = [
+        {"metadata": {"name": 'a"]}b'}, "spec": {"path": "C:\\"}},
+        {"metadata": {"name": "a"}, "spec": {"args": ["[", "{", "}]", "\\\"]"]}},
+        {"metadata": {"name": "\u00e9\U0001f600"}},
+        {"status": {"big": list(range(10))}, "metadata": {"name": "last"}},
+        {"spec": {"a": [[[[[[{"b": "]]}}"}]]]]]]}, "metadata": {"name": "deep"}},
+        {"spec": {"n": -1.5e-3, "t": True, "f": False, "z": None, "e": {}, "l": []}},
+        {"spec": None, "metadata": {"name": ""}},
+        {},
+    ]
+
+    def test_items(self):
+        for case in self.cases:
+            page = {"items": [case, {"metadata": {"name": "next"}}], "metadata": {}}
+            for raw in [
+                json.dumps(page).encode(),
+                json.dumps(page, indent=2).encode(),
+                json.dumps(page, ensure_ascii=False).encode(),
+                json.dumps(page, separators=(",", ":")).encode(),
+            ]:
+                with self.subTest(raw=raw):
+                    result = lazy.loads_page(raw)
+                    self.assertEqual(result["metadata"], {})
+                    self.assertEqual(
+                        [item_dict(i) for i in result["items"]], page["items"]
+                    )
+
+    def test_key_order(self):
+        # items before and after the list metadata, keys read out of order
+        raw = b'{"items": [{"b": 1, "a": {"x": "}"}}], "kind": "L", "metadata": {}}'
+        page = lazy.loads_page(raw)
+        self.assertEqual(page["kind"], "L")
+        item = page["items"][0]
+        self.assertEqual(item["a"], {"x": "}"})
+        self.assertEqual(item["b"], 1)
+        self.assertEqual(list(item), ["b", "a"])
+        self.assertNotIn("c", item)
+        self.assertEqual(len(item), 2)
+
+        raw = b'{"metadata": {"continue": "x"}, "items": []}'
+        self.assertEqual(
+            lazy.loads_page(raw), {"metadata": {"continue": "x"}, "items": []}
+        )
+
+    def test_escaped_keys(self):
+        # escaped keys are compared decoded, a quote and bracket inside a key
+        raw = (
+            b'{"items":[{"n\\u0061me":"\\u005d","s\\"}":{"k\\u00e9y":1}}],'
+            b'"metadata":{}}'
+        )
+        item = lazy.loads_page(raw)["items"][0]
+        self.assertEqual(item["name"], "]")
+        self.assertEqual(item['s"}'], {"k\u00e9y": 1})
+        self.assertEqual(list(item), ["name", 's"}'])
+
+    def test_decode_on_access(self):
+        raw = b'{"items": [{"metadata": {}, "status": {]}]}'
+        item = lazy.loads_page(raw)["items"][0]
+        # the malformed status is only decoded when read
+        self.assertEqual(item["metadata"], {})
+        with self.assertRaises(ValueError):
+            item["status"]
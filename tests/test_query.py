@@ -1,20 +1,34 @@
+import json
+import os
+import tempfile
+import time
 import yaml
 from unittest import TestCase, mock
 from jinja2 import PackageLoader, Environment, FileSystemLoader
+from kubernetes.config import ConfigException
 from kubernetes.dynamic import exceptions as api_exceptions
-from pharos import models, fields, exceptions, lookups, backend, jinja
+from pharos import models, fields, exceptions, lookups, backend, jinja, utils
+from pharos import iterator
 from pharos.jinja import to_yaml
 from pharos.backend import TemplateBackend
+from pharos.client import Client
+from pharos import query as query_module
 
 
 class BaseCase(TestCase):
     def setUp(self):
         self.dynamic_client = mock.Mock()
-        self.client = mock.Mock()
-        self.client.settings.enable_chunk = True
-        self.client.settings.chunk_size = 100
-        self.client.settings.jinja_loader = PackageLoader("tests", "./")
-        self.client.settings.template_engine = "pharos.jinja.JinjaEngine"
+        with mock.patch("pharos.client.kubernetes"):
+            self.client = Client(
+                "test",
+                disable_compress=True,
+                enable_chunk=True,
+                chunk_size=100,
+                jinja_loader=PackageLoader("tests", "./"),
+                template_engine="pharos.jinja.JinjaEngine",
+                # every api call below expects its own discovery lookup
+                resource_cache_ttl=0,
+            )
         self.client.dynamic_client = self.dynamic_client
 
 
@@ -88,6 +102,163 @@ class DeploymentTestCase(BaseCase):
             self.dynamic_client.resources.get.return_value.method_calls, expected_call
         )
 
+    def test_prefetch_iterator(self):
+        self.client.settings["prefetch_pages"] = 2
+        mock_response = mock.Mock()
+        response_lambda = lambda token: {
+            "metadata": {"continue": token},
+            "items": [{"id": token, "metadata": {"name": "test"}}],
+        }
+        mock_response.to_dict.side_effect = [
+            response_lambda(f"{i}") for i in [1, 2, 3, "END", 5]
+        ]
+        self.dynamic_client.resources.get.return_value.get.return_value = mock_response
+        query = models.Deployment.objects.using(self.client).all()
+        self.assertEqual([i.k8s_object["id"] for i in query], ["1", "2", "3", "END"])
+        self.assertEqual(
+            self.dynamic_client.resources.get.return_value.method_calls,
+            [
+                mock.call.get(_continue=None, limit=100),
+                mock.call.get(_continue="1", limit=100),
+                mock.call.get(_continue="2", limit=100),
+                mock.call.get(_continue="3", limit=100),
+            ],
+        )
+
+    def test_prefetch_iterator_error(self):
+        self.client.settings["prefetch_pages"] = 1
+        mock_response = mock.Mock()
+        mock_response.to_dict.side_effect = [
+            {"metadata": {"continue": "1"}, "items": [{"metadata": {"name": "a"}}]},
+            api_exceptions.ServiceUnavailableError(mock.Mock()),
+        ]
+        self.dynamic_client.resources.get.return_value.get.return_value = mock_response
+        query = models.Deployment.objects.using(self.client).all()
+        with self.assertRaises(api_exceptions.ServiceUnavailableError):
+            len(query)
+
+    def test_prefetch_iterator_stop(self):
+        self.client.settings["prefetch_pages"] = 1
+        mock_response = mock.Mock()
+        mock_response.to_dict.side_effect = lambda: {
+            "metadata": {"continue": "next"},
+            "items": [{"metadata": {"name": "a"}}],
+        }
+        self.dynamic_client.resources.get.return_value.get.return_value = mock_response
+        query = models.Deployment.objects.using(self.client).limit(3)
+        self.assertEqual(len(query), 3)
+        api_spec = self.dynamic_client.resources.get.return_value
+        # the worker stops once the consumer is gone, after an in-flight page
+        time.sleep(0.3)
+        calls = len(api_spec.method_calls)
+        time.sleep(0.3)
+        self.assertEqual(len(api_spec.method_calls), calls)
+        self.assertLessEqual(calls, 5)
+
+    def test_raw_decode(self):
+        self.client.settings["raw_decode"] = True
+        pages = [
+            {"metadata": {"continue": "1"}, "items": [{"metadata": {"name": "a"}}]},
+            {"metadata": {}, "items": [{"metadata": {"name": "b"}}]},
+        ]
+        api_spec = self.dynamic_client.resources.get.return_value
+        for orjson in (utils.orjson, None):
+            with self.subTest(orjson=orjson), mock.patch.object(utils, "orjson", orjson):
+                api_spec.reset_mock()
+                api_spec.get.side_effect = [
+                    mock.Mock(data=json.dumps(i).encode()) for i in pages
+                ]
+                query = models.Deployment.objects.using(self.client).all()
+                self.assertEqual([i.name for i in query], ["a", "b"])
+                self.assertEqual(
+                    api_spec.method_calls,
+                    [
+                        mock.call.get(serialize=False, _continue=None, limit=100),
+                        mock.call.get(serialize=False, _continue="1", limit=100),
+                    ],
+                )
+
+    def test_lazy_decode(self):
+        self.client.settings["lazy_decode"] = True
+        pages = [
+            {
+                "metadata": {"continue": "1"},
+                "items": [
+                    {"metadata": {"name": "a"}, "status": {"nodes": [{"ok": "]}"}]}},
+                    {"metadata": {"name": "b"}, "status": {"nodes": []}},
+                ],
+            },
+            {"metadata": {}, "items": [{"metadata": {"name": "ab"}, "spec": None}]},
+        ]
+        api_spec = self.dynamic_client.resources.get.return_value
+        api_spec.get.side_effect = [
+            mock.Mock(data=json.dumps(i, indent=1).encode()) for i in pages
+        ]
+        decoded = []
+
+        def loads(data):
+            decoded.append(data)
+            return json.loads(data)
+
+        with mock.patch.object(utils, "loads", side_effect=loads):
+            query = models.Deployment.objects.using(self.client).filter(
+                name__startswith="a"
+            )
+            result = list(query)
+        self.assertEqual([i.name for i in result], ["a", "ab"])
+        self.assertFalse([i for i in decoded if b"nodes" in i])
+        self.assertEqual(
+            api_spec.method_calls,
+            [
+                mock.call.get(serialize=False, _continue=None, limit=100),
+                mock.call.get(serialize=False, _continue="1", limit=100),
+            ],
+        )
+        self.assertEqual(result[0].k8s_object["status"], {"nodes": [{"ok": "]}"}]})
+        self.assertEqual(dict(result[1].k8s_object), pages[1]["items"][0])
+        self.assertIn("name: ab", result[1].yaml)
+
+    def test_iterator(self):
+        mock_response = mock.Mock()
+        response_lambda = lambda token: {
+            "metadata": {"continue": token},
+            "items": [
+                {"id": f"{token}-{i}", "metadata": {"name": f"test-{i}"}}
+                for i in range(3)
+            ],
+        }
+        mock_response.to_dict.side_effect = [
+            response_lambda(f"{i}") for i in [1, 2, "END"]
+        ]
+        self.dynamic_client.resources.get.return_value.get.return_value = mock_response
+        query = models.Deployment.objects.using(self.client).filter(
+            name__in=["test-0", "test-2"]
+        )
+        api_spec = self.dynamic_client.resources.get.return_value
+
+        instances = query.iterator()
+        first = next(instances)
+        self.assertEqual(first.k8s_object["id"], "1-0")
+        # pages are fetched only when consumed
+        self.assertEqual(len(api_spec.method_calls), 1)
+        self.assertEqual(
+            [i.k8s_object["id"] for i in instances], ["1-2", "2-0", "2-2", "END-0", "END-2"]
+        )
+        self.assertEqual(len(api_spec.method_calls), 3)
+        self.assertIsNone(query._result_cache)
+
+    def test_iterator_limit(self):
+        mock_response = mock.Mock()
+        mock_response.to_dict.side_effect = lambda: {
+            "metadata": {},
+            "items": [{"id": i, "metadata": {"name": "test"}} for i in range(5)],
+        }
+        self.dynamic_client.resources.get.return_value.get.return_value = mock_response
+        query = models.Deployment.objects.using(self.client).limit(2)
+        self.assertEqual([i.k8s_object["id"] for i in query.iterator()], [0, 1])
+        with self.assertRaises(exceptions.ClientNotSet):
+            models.Deployment.objects.all().iterator()
+
     def test_deployment_query_basic(self):
         test_cases = [
             {
@@ -373,6 +544,422 @@ class DeploymentTestCase(BaseCase):
             )
 
 
+class CountTestCase(BaseCase):
+    def setUp(self):
+        super().setUp()
+        self.api_spec = self.dynamic_client.resources.get.return_value
+        self.pod = {"metadata": {"name": "foo", "namespace": "default"}}
+
+    def test_count_remaining(self):
+        self.api_spec.get.return_value.to_dict.return_value = {
+            "metadata": {"continue": "1", "remainingItemCount": 41},
+            "items": [self.pod],
+        }
+        query = models.Pod.objects.using(self.client).filter(namespace="default")
+        self.assertEqual(query.count(), 42)
+        self.assertEqual(query.limit(10).count(), 10)
+        self.assertEqual(
+            self.api_spec.method_calls[0],
+            mock.call.get(namespace="default", limit=1),
+        )
+        self.assertTrue(query.exists())
+
+    def test_count_selector(self):
+        self.api_spec.get.return_value.to_dict.side_effect = [
+            {"metadata": {"continue": "1"}, "items": [self.pod]},
+            {"metadata": {"continue": "2"}, "items": [self.pod] * 100},
+            {"metadata": {}, "items": [self.pod] * 5},
+        ]
+        query = models.Pod.objects.using(self.client).filter(selector="app=foo")
+        self.assertEqual(query.count(), 105)
+        self.assertEqual(
+            self.api_spec.method_calls[1],
+            mock.call.get(
+                label_selector="app=foo",
+                header_params={"Accept": query_module.metadata_accept},
+                limit=100,
+                _continue=None,
+            ),
+        )
+
+    def test_count_cached_ignores_limit(self):
+        self.api_spec.get.return_value.to_dict.return_value = {
+            "metadata": {"resourceVersion": "10"},
+            "items": [self.pod] * 5,
+        }
+        query = (
+            models.Pod.objects.using(self.client)
+            .filter(selector="app=foo")
+            .consistency("cached")
+        )
+        self.assertEqual(query.count(), 5)
+        # the full list answered, no paging through metadata
+        self.assertEqual(
+            self.api_spec.method_calls,
+            [mock.call.get(label_selector="app=foo", resource_version="0", limit=1)],
+        )
+
+    def test_exists(self):
+        self.api_spec.get.return_value.to_dict.return_value = {
+            "metadata": {"continue": "1"},
+            "items": [self.pod],
+        }
+        query = models.Pod.objects.using(self.client).filter(selector="app=foo")
+        self.assertTrue(query.exists())
+        self.assertEqual(
+            self.api_spec.method_calls,
+            [mock.call.get(label_selector="app=foo", limit=1)],
+        )
+        self.api_spec.get.return_value.to_dict.return_value = {
+            "metadata": {},
+            "items": [],
+        }
+        self.assertFalse(query.exists())
+        self.assertEqual(query.count(), 0)
+
+    def test_count_not_found(self):
+        self.api_spec.get.side_effect = api_exceptions.NotFoundError(mock.Mock())
+        query = models.Pod.objects.using(self.client).filter(
+            name="foo", namespace="default"
+        )
+        self.assertEqual(query.count(), 0)
+        self.assertFalse(query.exists())
+
+    def test_count_post_lookups(self):
+        self.api_spec.get.return_value.to_dict.return_value = {
+            "metadata": {},
+            "items": [
+                {"metadata": {"name": "foo", "uid": "1"}},
+                {"metadata": {"name": "bar", "uid": "2"}},
+            ],
+        }
+        query = models.Pod.objects.using(self.client).filter(name__in=["foo", "baz"])
+        self.assertEqual(query.count(), 1)
+        self.assertTrue(query.exists())
+        self.assertFalse(
+            models.Pod.objects.using(self.client).filter(name__in=["baz"]).exists()
+        )
+
+
+class AdaptiveChunkTestCase(BaseCase):
+    def setUp(self):
+        super().setUp()
+        self.client.settings.update(
+            adaptive_chunk=True,
+            chunk_target_bytes=100_000,
+            chunk_target_seconds=1000,
+            chunk_max_size=600,
+        )
+        self.api_spec = self.dynamic_client.resources.get.return_value
+        self.api_spec.group_version = "v1"
+        self.api_spec.kind = "Pod"
+
+    def serve(self, total, padding):
+        def get(serialize, _continue, limit, **kwargs):
+            start = int(_continue or 0)
+            end = min(start + limit, total)
+            items = [
+                {"metadata": {"name": f"pod-{i}"}, "spec": "x" * padding}
+                for i in range(start, end)
+            ]
+            metadata = {"continue": str(end)} if end < total else {}
+            page = {"metadata": metadata, "items": items}
+            return mock.Mock(data=json.dumps(page).encode())
+
+        self.api_spec.get.side_effect = get
+
+    def limits(self):
+        return [i[2]["limit"] for i in self.api_spec.method_calls]
+
+    def test_grow(self):
+        # ~100 bytes per object, the target is ~1000 objects per page
+        self.serve(total=2000, padding=50)
+        self.assertEqual(len(models.Pod.objects.using(self.client).all()), 2000)
+        self.assertEqual(self.limits(), [100, 200, 400, 600, 600, 600])
+        self.assertEqual(self.client.chunk_sizes[("v1", "Pod", None)], 600)
+
+        # the next query starts from the learned size
+        self.api_spec.reset_mock()
+        self.assertEqual(len(models.Pod.objects.using(self.client).all()), 2000)
+        self.assertEqual(self.limits()[0], 600)
+
+    def test_shrink(self):
+        # ~2KB per object, the target is ~50 objects per page
+        self.serve(total=200, padding=2000)
+        self.assertEqual(len(models.Pod.objects.using(self.client).all()), 200)
+        self.assertEqual(self.limits(), [100, 48, 48, 48])
+
+    def test_adapt_chunk_size(self):
+        settings = self.client.settings
+        # slow pages shrink the next one
+        self.assertEqual(iterator.adapt_chunk_size(settings, 100, 100, None, 2000), 50)
+        self.assertEqual(iterator.adapt_chunk_size(settings, 100, 0, None, 1), 100)
+        self.assertEqual(iterator.adapt_chunk_size(settings, 100, 100, 10**9, 1), 10)
+
+
+class ConsistencyTestCase(BaseCase):
+    def setUp(self):
+        super().setUp()
+        self.api_spec = self.dynamic_client.resources.get.return_value
+        self.pages = [
+            {"metadata": {"continue": "1"}, "items": [{"metadata": {"name": "a"}}]},
+            {"metadata": {}, "items": [{"metadata": {"name": "b"}}]},
+        ]
+
+    def test_cached_chunks(self):
+        self.api_spec.get.return_value.to_dict.side_effect = self.pages
+        query = models.Pod.objects.using(self.client).consistency("cached")
+        self.assertEqual([i.name for i in query.filter(namespace="default")], ["a", "b"])
+        # resourceVersion can't be sent together with a continue token
+        self.assertEqual(
+            self.api_spec.method_calls,
+            [
+                mock.call.get(
+                    namespace="default", resource_version="0", _continue=None, limit=100
+                ),
+                mock.call.get(namespace="default", _continue="1", limit=100),
+            ],
+        )
+
+    def test_cached_unpaged(self):
+        # servers answering from the watch cache may ignore limit
+        self.api_spec.get.return_value.to_dict.return_value = {
+            "metadata": {},
+            "items": self.pages[0]["items"] + self.pages[1]["items"],
+        }
+        query = models.Pod.objects.using(self.client).consistency("cached")
+        self.assertEqual(query.count(), 2)
+        self.assertEqual(len(query), 2)
+        self.assertEqual(
+            self.api_spec.method_calls,
+            [
+                mock.call.get(resource_version="0", limit=1),
+                mock.call.get(resource_version="0", _continue=None, limit=100),
+            ],
+        )
+
+    def test_strong(self):
+        self.api_spec.get.return_value.to_dict.side_effect = self.pages
+        query = models.Pod.objects.using(self.client).consistency("cached")
+        self.assertEqual(len(query.consistency("strong")), 2)
+        self.assertEqual(query._consistency, "cached")
+        for call in self.api_spec.method_calls:
+            self.assertNotIn("resource_version", call[2])
+
+    def test_informer(self):
+        self.client.settings["enable_informer"] = True
+        informer = mock.Mock()
+        informer.list.return_value = [{"metadata": {"name": "a"}}]
+        with mock.patch.object(self.client, "get_informer", return_value=informer):
+            query = models.Pod.objects.using(self.client).consistency("cached")
+            self.assertEqual([i.name for i in query], ["a"])
+        informer.list.assert_called_once_with(resource_version="0")
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            models.Pod.objects.using(self.client).consistency("eventual")
+
+
+class ProjectionTestCase(BaseCase):
+    def setUp(self):
+        super().setUp()
+        self.dynamic_client.resources.get.return_value.get.return_value.to_dict.return_value = {
+            "metadata": {},
+            "items": [
+                {
+                    "metadata": {"name": f"pod-{i}", "namespace": "default"},
+                    "spec": {"containers": [{"name": "nginx"}] * 10},
+                    "status": {"phase": phase},
+                }
+                for i, phase in enumerate(["Running", "Failed"])
+            ],
+        }
+        self.query = PhasePod.objects.using(self.client)
+
+    def test_values(self):
+        self.assertEqual(
+            list(self.query.values("name", "phase")),
+            [
+                {"name": "pod-0", "phase": "Running"},
+                {"name": "pod-1", "phase": "Failed"},
+            ],
+        )
+        self.assertEqual(
+            list(self.query.values()),
+            [
+                {"name": "pod-0", "namespace": "default"},
+                {"name": "pod-1", "namespace": "default"},
+            ],
+        )
+
+    def test_values_list(self):
+        query = self.query.filter(phase="Failed")
+        self.assertEqual(list(query.values_list("name", "phase")), [("pod-1", "Failed")])
+        self.assertEqual(list(query.values_list("name", flat=True)), ["pod-1"])
+        self.assertEqual(query.values_list("name", flat=True).get(), "pod-1")
+        with self.assertRaises(TypeError):
+            query.values_list("name", "phase", flat=True)
+        with self.assertRaises(exceptions.FieldDoesNotExist):
+            query.values_list("foo")
+
+    def test_only(self):
+        pods = list(self.query.only("phase"))
+        self.assertEqual(pods[0].phase, "Running")
+        self.assertEqual(
+            pods[1].k8s_object.data,
+            {
+                "metadata": {"name": "pod-1", "namespace": "default"},
+                "status": {"phase": "Failed"},
+            },
+        )
+
+    def test_metadata_only(self):
+        api_spec = self.dynamic_client.resources.get.return_value
+        metadata = {"Accept": query_module.metadata_accept}
+        cases = [
+            (self.query.values("name", "namespace"), metadata),
+            (self.query.values_list("name", flat=True), metadata),
+            (self.query.only("owner").filter(name="pod-0"), metadata),
+            (self.query.values("name", "phase"), None),
+            (self.query.values("name").filter(ip="1.1.1.1"), None),
+            (self.query.all(), None),
+            (self.query.metadata_only(), metadata),
+        ]
+        for query, headers in cases:
+            with self.subTest(query=query.query):
+                api_spec.reset_mock()
+                list(query)
+                kwargs = api_spec.get.call_args.kwargs
+                self.assertEqual(kwargs.get("header_params"), headers)
+
+    def test_prune_paths(self):
+        obj = {"a": {"b": 1, "c": 2}, "d": [1], "e": 3}
+        self.assertEqual(
+            fields.prune_paths(obj, [("a", "b"), ("d",), ("x", "y"), ("e", "f")]),
+            {"a": {"b": 1}, "d": [1]},
+        )
+        self.assertIs(fields.prune_paths(obj, [("a",), None]), obj)
+
+
+class PrefetchRelatedTestCase(BaseCase):
+    def test_prefetch_related(self):
+        def make(uid, labels=None, owner=None, selector=None):
+            obj = {
+                "metadata": {
+                    "name": f"obj-{uid}",
+                    "namespace": "default",
+                    "uid": uid,
+                    "labels": labels or {},
+                    "ownerReferences": [{"uid": owner}] if owner else [],
+                }
+            }
+            if selector:
+                obj["spec"] = {"selector": {"matchLabels": selector}}
+            return obj
+
+        responses = {
+            "Deployment": [
+                make("d1", selector={"app": "foo"}),
+                make("d2", selector={"app": "bar"}),
+            ],
+            "ReplicaSet": [
+                make("r1", {"app": "foo"}, "d1", {"app": "foo"}),
+                make("r2", {"app": "bar"}, "d2", {"app": "bar"}),
+                make("r3", {"app": "bar"}, "d2", {"app": "bar"}),
+            ],
+            "Pod": [
+                make("p1", {"app": "foo"}, "r1"),
+                make("p2", {"app": "bar"}, "r2"),
+                make("p3", {"app": "bar"}, "r3"),
+                make("p4", {"app": "bar"}, "r1"),
+            ],
+        }
+
+        def get_resource(api_version, kind):
+            api_spec = mock.Mock()
+            api_spec.get.return_value.to_dict.return_value = {
+                "metadata": {},
+                "items": responses[kind],
+            }
+            api_specs.append((kind, api_spec))
+            return api_spec
+
+        api_specs = []
+        self.dynamic_client.resources.get.side_effect = get_resource
+        query = models.Deployment.objects.using(self.client).prefetch_related(
+            "pods", "replicasets"
+        )
+        result = {
+            i.name: (
+                [p.name for p in i.pods.all()],
+                [r.name for r in i.replicasets.all()],
+            )
+            for i in query
+        }
+        self.assertEqual(
+            result,
+            {
+                "obj-d1": (["obj-p1"], ["obj-r1"]),
+                "obj-d2": (["obj-p2", "obj-p3"], ["obj-r2", "obj-r3"]),
+            },
+        )
+        # one list per kind, related querysets are served from memory
+        self.assertEqual(
+            [i[0] for i in api_specs], ["Deployment", "ReplicaSet", "Pod"]
+        )
+        self.assertEqual(
+            api_specs[1][1].method_calls,
+            [mock.call.get(_continue=None, limit=100, namespace="default")],
+        )
+
+    def test_prefetch_related_count(self):
+        responses = {
+            "Service": [
+                {
+                    "metadata": {"name": "svc", "namespace": "default"},
+                    "spec": {"selector": {"app": "foo"}},
+                }
+            ],
+            "Pod": [
+                {
+                    "metadata": {
+                        "name": f"pod-{i}",
+                        "namespace": "default",
+                        "labels": {"app": app},
+                    }
+                }
+                for i, app in enumerate(["foo", "foo", "bar"])
+            ],
+        }
+
+        def get_resource(api_version, kind):
+            api_spec = mock.Mock()
+            api_spec.get.return_value.to_dict.return_value = {
+                "metadata": {},
+                "items": responses[kind],
+            }
+            api_specs.append(kind)
+            return api_spec
+
+        api_specs = []
+        self.dynamic_client.resources.get.side_effect = get_resource
+        service = models.Service.objects.using(self.client).prefetch_related("pods")[0]
+        self.assertEqual(api_specs, ["Service", "Pod"])
+        self.assertEqual(service.pods.count(), 2)
+        self.assertTrue(service.pods.exists())
+        self.assertFalse(service.pods.filter(selector="app=baz").exists())
+        # answered from the prefetched pods
+        self.assertEqual(api_specs, ["Service", "Pod"])
+
+    def test_prefetch_related_invalid(self):
+        self.dynamic_client.resources.get.return_value.get.return_value.to_dict.return_value = {
+            "metadata": {},
+            "items": [{"metadata": {"name": "foo"}}],
+        }
+        with self.assertRaises(exceptions.FieldDoesNotExist):
+            len(models.Deployment.objects.using(self.client).prefetch_related("name"))
+
+
 class ServicePodsTestCase(BaseCase):
     def test_service_pods(self):
         service = models.Service(
@@ -528,6 +1115,363 @@ class CustomModelTestCase(BaseCase):
         self.assertEqual(len(queryset), 1)
 
 
+class PhasePod(models.Pod):
+    phase = fields.JsonPathField(path="status.phase")
+    ip = fields.JsonPathField(path="status.hostIP")
+
+
+class PushdownTestCase(BaseCase):
+    def setUp(self):
+        super().setUp()
+        self.client.settings["field_selector_pushdown"] = True
+        self.api_spec = self.dynamic_client.resources.get.return_value
+        self.api_spec.get.return_value.to_dict.side_effect = lambda: {
+            "metadata": {},
+            "items": [
+                {"metadata": {"name": "foo"}, "status": {"phase": "Running"}},
+                {"metadata": {"name": "bar"}, "status": {"phase": "Failed"}},
+            ],
+        }
+
+    def test_pushdown(self):
+        # the mocked API does not filter, pushed down lookups keep every item
+        test_cases = [
+            {
+                "query": PhasePod.objects.using(self.client).filter(phase="Running"),
+                "api_calls": [{"field_selector": "status.phase=Running"}],
+                "count": 2,
+            },
+            {
+                "query": PhasePod.objects.using(self.client).filter(phase__ne="Running"),
+                "api_calls": [{"field_selector": "status.phase!=Running"}],
+                "count": 2,
+            },
+            {
+                "query": PhasePod.objects.using(self.client)
+                .filter(field_selector="spec.nodeName=foo")
+                .filter(phase="Running", namespace="default"),
+                "api_calls": [
+                    {
+                        "namespace": "default",
+                        "field_selector": "spec.nodeName=foo,status.phase=Running",
+                    }
+                ],
+                "count": 2,
+            },
+            {
+                "query": PhasePod.objects.using(self.client).filter(
+                    name__in=["foo", "bar", "foo"]
+                ),
+                "api_calls": [
+                    {"field_selector": "metadata.name=foo"},
+                    {"field_selector": "metadata.name=bar"},
+                ],
+                "count": 4,
+            },
+            {
+                "query": PhasePod.objects.using(self.client).filter(
+                    name="foo,bar", phase__in=["Running"]
+                ),
+                "api_calls": [
+                    {"name": "foo,bar", "field_selector": "status.phase=Running"}
+                ],
+                "count": 2,
+            },
+            {
+                # status.hostIP is not a field selector, filtered after listing
+                "query": PhasePod.objects.using(self.client).filter(ip="1.1.1.1"),
+                "api_calls": [{}],
+                "count": 0,
+            },
+            {
+                "query": CustomModel.objects.using(self.client).filter(
+                    task="task1", name__ne="a,b"
+                ),
+                "api_calls": [{"field_selector": "metadata.name!=a\\,b"}],
+                "count": 0,
+            },
+        ]
+        for case in test_cases:
+            self.dynamic_client.reset_mock()
+            with self.subTest(case=case):
+                self.assertEqual(len(case["query"]), case["count"])
+                self.assertEqual(
+                    self.api_spec.method_calls,
+                    [
+                        mock.call.get(**kwargs, _continue=None, limit=100)
+                        for kwargs in case["api_calls"]
+                    ],
+                )
+
+    def test_pushdown_metadata_only(self):
+        query = PhasePod.objects.using(self.client).filter(phase="Running")
+        list(query.values_list("name", flat=True))
+        # phase is filtered by the server, the projection only reads metadata
+        self.assertEqual(
+            self.api_spec.get.call_args[1]["header_params"],
+            {"Accept": query_module.metadata_accept},
+        )
+
+        self.dynamic_client.reset_mock()
+        list(query.filter(ip="1.1.1.1").values_list("name", flat=True))
+        self.assertNotIn("header_params", self.api_spec.get.call_args[1])
+
+    def test_pushdown_disabled(self):
+        self.client.settings["field_selector_pushdown"] = False
+        query = PhasePod.objects.using(self.client).filter(phase="Running")
+        self.assertEqual([i.name for i in query], ["foo"])
+        self.assertEqual(
+            self.api_spec.method_calls, [mock.call.get(_continue=None, limit=100)]
+        )
+
+    def test_in_over_limit(self):
+        self.client.settings["pushdown_in_limit"] = 1
+        query = PhasePod.objects.using(self.client).filter(name__in=["foo", "baz"])
+        self.assertEqual([i.name for i in query], ["foo"])
+        self.assertEqual(
+            self.api_spec.method_calls, [mock.call.get(_continue=None, limit=100)]
+        )
+
+
+class AcrossTestCase(TestCase):
+    def make_client(self, context, names=None, error=None):
+        with mock.patch("pharos.client.kubernetes"):
+            # the mocked api does not filter, keep lookups local
+            client = Client(
+                "test",
+                context=context,
+                disable_compress=True,
+            )
+        client.dynamic_client = mock.Mock()
+        api_spec = client.dynamic_client.resources.get.return_value
+        if error:
+            api_spec.get.side_effect = error
+        else:
+            api_spec.get.return_value.to_dict.return_value = {
+                "metadata": {},
+                "items": [{"metadata": {"name": i}} for i in names],
+            }
+        return client
+
+    def test_across_clients(self):
+        c1 = self.make_client("c1", ["foo", "bar"])
+        c2 = self.make_client("c2", error=api_exceptions.ForbiddenError(mock.Mock()))
+        c3 = self.make_client("c3", ["baz"])
+        query = models.Pod.objects.across([c1, c2, c3]).filter(name__in=["foo", "baz"])
+        result = [(i.name, i.client) for i in query]
+        self.assertEqual(result, [("foo", c1), ("baz", c3)])
+        self.assertEqual(list(query.errors), [c2])
+        self.assertIsInstance(query.errors[c2], api_exceptions.ForbiddenError)
+
+    def test_across_limit(self):
+        clients = [self.make_client(f"c{i}", ["foo", "bar"]) for i in range(3)]
+        query = models.Pod.objects.across(clients).limit(3)
+        self.assertEqual(len(query), 3)
+        self.assertEqual(len(list(query.iterator())), 3)
+
+    def test_across_contexts(self):
+        client = self.make_client("c1", ["foo"])
+        other = self.make_client("c2", ["bar"])
+        with mock.patch.object(Client, "with_context", return_value=other) as m:
+            query = models.Pod.objects.using(client).across(["c2"])
+            self.assertEqual([i.name for i in query], ["bar"])
+            query = models.Pod.objects.using(client).across(["c2"])
+            self.assertEqual([i.name for i in query], ["bar"])
+        # context clients are built once per client
+        m.assert_called_once_with("c2")
+        with self.assertRaises(exceptions.ClientNotSet):
+            len(models.Pod.objects.across(["c2"]))
+
+    def test_across_bad_context(self):
+        client = self.make_client("c1", ["foo"])
+        other = self.make_client("c2", ["bar"])
+        error = ConfigException("Invalid kube-config file. Expected missing")
+
+        def with_context(context):
+            if context == "missing":
+                raise error
+            return other
+
+        with mock.patch.object(Client, "with_context", side_effect=with_context):
+            query = models.Pod.objects.using(client).across([client, "missing", "c2"])
+            self.assertEqual([i.name for i in query], ["foo", "bar"])
+        self.assertEqual(query.errors, {"missing": error})
+
+    def test_across_prefetch_related(self):
+        def make_client(context, kinds):
+            with mock.patch("pharos.client.kubernetes"):
+                client = Client(
+                    "test",
+                    context=context,
+                    disable_compress=True,
+                    resource_cache_ttl=0,
+                )
+            client.dynamic_client = mock.Mock()
+
+            def get_resource(api_version, kind):
+                calls.append((context, kind))
+                api_spec = mock.Mock()
+                api_spec.get.return_value.to_dict.return_value = {
+                    "metadata": {},
+                    "items": kinds[kind],
+                }
+                return api_spec
+
+            client.dynamic_client.resources.get.side_effect = get_resource
+            return client
+
+        def cluster(name):
+            return {
+                "Service": [
+                    {
+                        "metadata": {"name": f"svc-{name}", "namespace": "default"},
+                        "spec": {"selector": {"app": "foo"}},
+                    }
+                ],
+                "Pod": [
+                    {
+                        "metadata": {
+                            "name": f"pod-{name}",
+                            "namespace": "default",
+                            "labels": {"app": "foo"},
+                        }
+                    }
+                ],
+            }
+
+        calls = []
+        c1 = make_client("c1", cluster("c1"))
+        c2 = make_client("c2", cluster("c2"))
+        for query in [
+            models.Service.objects.using(c1).across([c1, c2]),
+            models.Service.objects.across([c1, c2]),
+        ]:
+            with self.subTest(query=query):
+                calls.clear()
+                result = {
+                    i.name: [p.name for p in i.pods.all()]
+                    for i in query.prefetch_related("pods")
+                }
+                self.assertEqual(
+                    result, {"svc-c1": ["pod-c1"], "svc-c2": ["pod-c2"]}
+                )
+                # pods are listed once per cluster, not per service
+                self.assertEqual(
+                    sorted(calls),
+                    [("c1", "Pod"), ("c1", "Service"), ("c2", "Pod"), ("c2", "Service")],
+                )
+
+
+class ModelStorageTestCase(TestCase):
+    def test_compact(self):
+        obj = {"metadata": {"name": "foo", "labels": {"app": "nginx"}}}
+        pod = models.Pod(client=None, k8s_object=obj)
+        self.assertFalse(hasattr(pod, "__dict__"))
+        self.assertFalse(hasattr(pod.k8s_object, "__dict__"))
+        self.assertIs(pod.k8s_object.data, obj)
+        self.assertEqual(pod.k8s_object, obj)
+        self.assertEqual(dict(pod.k8s_object), obj)
+        self.assertEqual(pod.k8s_object.get("spec"), None)
+        copied = pod.k8s_object.copy()
+        copied["spec"] = {}
+        self.assertEqual(copied, dict(obj, spec={}))
+        self.assertNotIn("spec", obj)
+        with self.assertRaises(TypeError):
+            pod.k8s_object["spec"] = {}
+        # wrapping a view again does not nest
+        self.assertIs(utils.ReadOnlyDict(pod.k8s_object).data, obj)
+        self.assertEqual(yaml.safe_load(pod.yaml), obj)
+
+
+class CompiledFieldTestCase(TestCase):
+    def test_compile(self):
+        cases = [
+            ("metadata.name", ("metadata", "name")),
+            ("$.metadata.name", ("metadata", "name")),
+            (
+                'metadata.annotations."pharos.py/template"',
+                ("metadata", "annotations", "pharos.py/template"),
+            ),
+            ("json", ("json",)),
+            ("$.metadata.ownerReferences[*].uid", None),
+            ("metadata.*", None),
+            ("spec.containers[?(@.name=='foo')].image", None),
+        ]
+        for path, keys in cases:
+            with self.subTest(path=path):
+                self.assertEqual(fields.JsonPathField(path=path).keys, keys)
+
+    def test_same_as_jsonpath(self):
+        objects = [
+            {"metadata": {"name": "foo", "annotations": {"pharos.py/template": "a"}}},
+            {"metadata": {"name": None, "annotations": None}},
+            {"metadata": ["foo"]},
+            {"metadata": "foo"},
+            {},
+        ]
+        paths = [
+            "metadata.name",
+            'metadata.annotations."pharos.py/template"',
+            "metadata.uid",
+        ]
+        for path in paths:
+            field = fields.JsonPathField(path=path)
+            for obj in objects:
+                with self.subTest(path=path, obj=obj):
+                    self.assertEqual(
+                        field.get_value(obj),
+                        fields.find_jsonpath_value(field.jsonpath_expr, obj),
+                    )
+
+
+class RenderCacheTestCase(TestCase):
+    def test_lru(self):
+        cache = backend.RenderCache(2)
+        cache.set("a", {"a": 1})
+        cache.set("b", {"b": 1})
+        cache.get("a")
+        cache.set("c", {"c": 1})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        value = cache.get("a")
+        value["a"] = 2
+        self.assertEqual(cache.get("a"), {"a": 1})
+
+    def test_render_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cm.yaml")
+            with open(path, "w") as f:
+                f.write("kind: ConfigMap\nmetadata:\n  name: {{ name }}\n")
+            client = mock.Mock()
+            client.settings.template_bytecode_cache_dir = None
+            client.settings.template_cache_size = 10
+            engine = jinja.JinjaEngine(client, loader=FileSystemLoader(tmp))
+            cache = backend.RenderCache(10)
+            template_backend = TemplateBackend()
+            template_backend.set_engine(engine)
+            template_backend.set_cache(cache)
+
+            with mock.patch("pharos.jinja.yaml.safe_load", wraps=yaml.safe_load) as load:
+                first = template_backend.render("default", "cm.yaml", {"name": "a"}, False)
+                first["metadata"]["name"] = "changed"
+                second = template_backend.render("default", "cm.yaml", {"name": "a"}, False)
+                self.assertEqual(second["metadata"]["name"], "a")
+                self.assertEqual(load.call_count, 1)
+
+                template_backend.render("other", "cm.yaml", {"name": "a"}, False)
+                template_backend.render("default", "cm.yaml", {"name": "b"}, False)
+                self.assertEqual(load.call_count, 3)
+
+                # template source changed on disk
+                with open(path, "w") as f:
+                    f.write("kind: ConfigMap\nmetadata:\n  name: x-{{ name }}\n")
+                mtime = os.path.getmtime(path) + 10
+                os.utime(path, (mtime, mtime))
+                third = template_backend.render("default", "cm.yaml", {"name": "a"}, False)
+                self.assertEqual(third["metadata"]["name"], "x-a")
+                self.assertEqual(load.call_count, 4)
+
+
 class Step:
     parent = None
     client = None
@@ -652,6 +1596,24 @@ class DeleteResource(Step):
         return self.parent.delete(self.name, self.namespace)
 
 
+class WatchCrd(Step):
+    def __init__(self, inherit=False):
+        self.inherit = inherit
+
+    @property
+    def call(self):
+        return self.parent.watch(name="variables.pharos.py", timeout=10)
+
+
+established_event = {
+    "type": "ADDED",
+    "raw_object": {
+        "metadata": {"name": "variables.pharos.py"},
+        "status": {"conditions": [{"type": "Established", "status": "True"}]},
+    },
+}
+
+
 class ToDict(Step):
     parent = mock.call.resources.get().create()
 
@@ -664,6 +1626,12 @@ class ToDict(Step):
 
 
 class ResourceCreateTestCase(BaseCase):
+    def setUp(self):
+        super().setUp()
+        self.dynamic_client.resources.get.return_value.watch.return_value = [
+            established_event
+        ]
+
     def assertQuery(self, steps, query):
         expected_calls = []
         for step in steps:
@@ -693,6 +1661,8 @@ class ResourceCreateTestCase(BaseCase):
             GetSpec("apiextensions.k8s.io/v1", "CustomResourceDefinition"),
             CreateResource("variable_crd.yaml", {}, inherit=True, internal=True),
             ToDict(inherit=True),
+            GetSpec("apiextensions.k8s.io/v1", "CustomResourceDefinition"),
+            WatchCrd(inherit=True),
             GetSpec("pharos.py/v1", "Variable"),
             CreateResource(
                 "variables.yaml",
@@ -707,6 +1677,103 @@ class ResourceCreateTestCase(BaseCase):
         )
         self.assertQuery(expected_steps, query)
 
+    def test_variable_crd_cached(self):
+        api_spec = self.dynamic_client.resources.get.return_value
+        pending = {"type": "ADDED", "raw_object": {"metadata": {}, "status": {}}}
+        api_spec.watch.return_value = [pending]
+        api_spec.create.return_value.to_dict.return_value = {"metadata": {}}
+        api_spec.get.return_value.to_dict.return_value = {"metadata": {}}
+        query = models.Deployment.objects.using(self.client)
+        with self.assertRaises(exceptions.CrdNotEstablished):
+            query._create_variable_crd()
+        # not established before the watch timed out, try again next time
+        self.assertFalse(self.client.variable_crd_ready)
+        api_spec.get.assert_called_once_with(name="variables.pharos.py")
+
+        # established while nobody watched
+        api_spec.get.return_value.to_dict.return_value = established_event["raw_object"]
+        query._create_variable_crd()
+        self.assertTrue(self.client.variable_crd_ready)
+        self.client.variable_crd_ready = False
+
+        api_spec.create.side_effect = api_exceptions.ConflictError(mock.Mock())
+        api_spec.watch.return_value = [pending, established_event]
+        query._create_variable_crd()
+        self.assertTrue(self.client.variable_crd_ready)
+
+        api_spec.reset_mock()
+        query._create_variable_crd()
+        self.assertEqual(api_spec.method_calls, [])
+
+        with mock.patch("pharos.client.kubernetes"):
+            self.client.use_context("other")
+        self.assertFalse(self.client.variable_crd_ready)
+
+    def test_bulk_create(self):
+        def create(body, namespace, **kwargs):
+            if namespace == "bad":
+                raise api_exceptions.ForbiddenError(mock.Mock())
+            created.append((body["kind"], namespace))
+            response = mock.Mock()
+            response.to_dict.return_value = {
+                **body,
+                "metadata": {**body["metadata"], "namespace": namespace},
+            }
+            return response
+
+        created = []
+        api_spec = self.dynamic_client.resources.get.return_value
+        api_spec.create.side_effect = create
+        items = [
+            ("test.yaml", {"label_name": "foo"}, "ns1"),
+            ("test.yaml", {"label_name": "foo"}, "bad"),
+            ("missing.yaml", {}, "ns2"),
+            ("test.yaml", {"label_name": "bar"}, "ns3"),
+        ]
+        self.client.k8s_client.configuration.connection_pool_maxsize = 2
+        with mock.patch.object(
+            query_module, "ThreadPoolExecutor", wraps=query_module.ThreadPoolExecutor
+        ) as executor:
+            results = models.Deployment.objects.using(self.client).bulk_create(
+                items, concurrency=10
+            )
+        executor.assert_called_once_with(max_workers=2)
+        self.assertEqual([i.item for i in results], items)
+        self.assertEqual(
+            [i.instance.namespace if i.instance else None for i in results],
+            ["ns1", None, None, "ns3"],
+        )
+        self.assertIsInstance(results[1].error, api_exceptions.ForbiddenError)
+        self.assertIsNotNone(results[2].error)
+        # the variable crd is checked once for the whole batch
+        self.assertEqual(
+            sorted(created),
+            [
+                ("CustomResourceDefinition", "default"),
+                ("Deployment", "ns1"),
+                ("Deployment", "ns3"),
+                ("Variable", "ns1"),
+                ("Variable", "ns3"),
+            ],
+        )
+
+    def test_bulk_create_crd_error(self):
+        api_spec = self.dynamic_client.resources.get.return_value
+        error = api_exceptions.ForbiddenError(mock.Mock())
+        api_spec.create.side_effect = error
+        items = [
+            ("test.yaml", {"label_name": "foo"}, "ns1"),
+            ("missing.yaml", {}, "ns2"),
+        ]
+        results = models.Deployment.objects.using(self.client).bulk_create(items)
+        self.assertEqual([i.instance for i in results], [None, None])
+        self.assertIs(results[0].error, error)
+        # the render error is kept for items that failed before
+        self.assertIsNotNone(results[1].error)
+        self.assertIsNot(results[1].error, error)
+        # only the variable crd was attempted
+        self.assertEqual(api_spec.create.call_count, 1)
+
     def test_create_deployment_namespace(self):
         mock_response = {
             "metadata": {
@@ -728,6 +1795,8 @@ class ResourceCreateTestCase(BaseCase):
             GetSpec("apiextensions.k8s.io/v1", "CustomResourceDefinition"),
             CreateResource("variable_crd.yaml", {}, inherit=True, internal=True),
             ToDict(inherit=True),
+            GetSpec("apiextensions.k8s.io/v1", "CustomResourceDefinition"),
+            WatchCrd(inherit=True),
             GetSpec("pharos.py/v1", "Variable"),
             CreateResource(
                 "variables.yaml",
@@ -770,6 +1839,12 @@ class ResourceCreateTestCase(BaseCase):
 
 
 class ResourceUpdateTestCase(BaseCase):
+    def setUp(self):
+        super().setUp()
+        self.dynamic_client.resources.get.return_value.watch.return_value = [
+            established_event
+        ]
+
     def assertQuery(self, steps, query):
         expected_calls = []
         for step in steps:
@@ -821,6 +1896,8 @@ class ResourceUpdateTestCase(BaseCase):
             GetSpec("apiextensions.k8s.io/v1", "CustomResourceDefinition"),
             CreateResource("variable_crd.yaml", {}, inherit=True, internal=True),
             ToDict(inherit=True),
+            GetSpec("apiextensions.k8s.io/v1", "CustomResourceDefinition"),
+            WatchCrd(inherit=True),
             GetSpec("pharos.py/v1", "Variable"),
             DeleteResource('deployment-foobar-default', None),
             GetSpec("pharos.py/v1", "Variable"),
@@ -889,6 +1966,155 @@ class ResourceUpdateTestCase(BaseCase):
         ]
         self.assertQuery(expected_steps, query)
 
+    def make_deployment(self):
+        response = {
+            "metadata": {
+                "name": "nginx-deployment",
+                "namespace": "default",
+                "resourceVersion": "2",
+                "annotations": {"pharos.py/template": "test.yaml"},
+            },
+            "json": {"label_name": "foo"},
+        }
+        api_spec = self.dynamic_client.resources.get.return_value
+        api_spec.get.return_value.to_dict.return_value = response
+        for method in ("replace", "patch", "server_side_apply"):
+            getattr(api_spec, method).return_value.to_dict.return_value = response
+        deployment = models.Deployment(
+            client=self.client,
+            k8s_object={
+                "metadata": {
+                    "name": "nginx-deployment",
+                    "namespace": "default",
+                    "annotations": {
+                        "pharos.py/template": "test.yaml",
+                        "pharos.py/variable": "deployment-nginx-deployment-default",
+                    },
+                }
+            },
+        )
+        deployment.set_variable({"label_name": "bar"})
+        return deployment, api_spec
+
+    def test_update_deployment_apply(self):
+        self.client.settings["update_strategy"] = "apply"
+        deployment, api_spec = self.make_deployment()
+        deployment.deploy()
+        calls = [i for i in api_spec.method_calls if i[0] != "get"]
+        # no refresh before the write
+        self.assertEqual(len(api_spec.method_calls) - len(calls), 1)
+        name, args, kwargs = calls[0]
+        self.assertEqual(name, "server_side_apply")
+        self.assertEqual(kwargs["field_manager"], "pharos")
+        self.assertEqual(kwargs["force_conflicts"], False)
+        self.assertEqual(kwargs["body"]["metadata"]["labels"]["bar"], "label")
+        self.assertNotIn("resourceVersion", kwargs["body"]["metadata"])
+        # the variable is still replaced at its read version
+        self.assertEqual([i[0] for i in calls], ["server_side_apply", "replace"])
+
+        self.client.settings["force_conflicts"] = True
+        deployment.deploy()
+        kwargs = api_spec.server_side_apply.call_args[1]
+        self.assertEqual(kwargs["force_conflicts"], True)
+
+    def test_update_deployment_merge(self):
+        self.client.settings["update_strategy"] = "merge"
+        deployment, api_spec = self.make_deployment()
+        deployment.deploy(dry_run=True)
+        calls = [i for i in api_spec.method_calls if i[0] != "get"]
+        name, args, kwargs = calls[0]
+        self.assertEqual(name, "patch")
+        self.assertEqual(kwargs["content_type"], "application/merge-patch+json")
+        self.assertEqual(kwargs["query_params"], [("dryRun", "All")])
+        self.assertEqual(
+            kwargs["body"], {"metadata": {"labels": {"foo": None, "bar": "label"}}}
+        )
+
+    def test_sync_merge_removes_fields(self):
+        self.client.settings["update_strategy"] = "merge"
+        deployment, api_spec = self.make_deployment()
+        # last applied with label_name=foo, the new variables drop that label
+        deployment.sync("test.yaml", {"label_name": "baz"}, dry_run=True)
+        calls = [i for i in api_spec.method_calls if i[0] == "patch"]
+        self.assertEqual(len(calls), 1)
+        body = calls[0][2]["body"]
+        self.assertEqual(list(body), ["metadata"])
+        self.assertEqual(body["metadata"]["labels"], {"foo": None, "baz": "label"})
+
+    def test_sync_merge_without_variable(self):
+        self.client.settings["update_strategy"] = "merge"
+        deployment, api_spec = self.make_deployment()
+        api_spec.get.return_value.to_dict.return_value = {"metadata": {}, "items": []}
+        deployment.sync("test.yaml", {"label_name": "baz"}, dry_run=True)
+        body = api_spec.patch.call_args[1]["body"]
+        # nothing to compare with, the whole spec is sent
+        self.assertEqual(body["spec"]["replicas"], 3)
+
+    @mock.patch("pharos.models.time")
+    def test_optimistic_update(self, time_mock):
+        self.client.settings["optimistic_update"] = True
+        deployment, api_spec = self.make_deployment()
+        deployment.k8s_object["metadata"]["resourceVersion"] = "1"
+        replace = api_spec.replace
+        replace.side_effect = [
+            api_exceptions.ConflictError(mock.Mock()),
+            replace.return_value,
+            replace.return_value,
+        ]
+        deployment.deploy()
+        versions = [
+            i.kwargs["body"]["metadata"]["resourceVersion"] for i in replace.call_args_list
+        ]
+        # cached version first, the refreshed one after a conflict, then the variable
+        self.assertEqual(versions, ["1", "2", "2"])
+        self.assertEqual(time_mock.sleep.call_count, 1)
+        self.assertTrue(0.05 <= time_mock.sleep.call_args[0][0] <= 0.15)
+        # the only refresh is the one after the conflict
+        refresh = mock.call.get(name="nginx-deployment", namespace="default")
+        self.assertEqual(api_spec.method_calls.count(refresh), 1)
+
+    @mock.patch("pharos.models.time")
+    def test_optimistic_update_retries(self, time_mock):
+        self.client.settings["optimistic_update"] = True
+        self.client.settings["conflict_retries"] = 2
+        deployment, api_spec = self.make_deployment()
+        api_spec.replace.side_effect = api_exceptions.ConflictError(mock.Mock())
+        with self.assertRaises(api_exceptions.ConflictError):
+            deployment.deploy()
+        self.assertEqual(api_spec.replace.call_count, 3)
+        self.assertEqual(time_mock.sleep.call_count, 2)
+
+    def test_update_unchanged(self):
+        self.client.settings["skip_unchanged"] = True
+        deployment, api_spec = self.make_deployment()
+        rendered = models.Deployment.objects.using(self.client)._render(
+            "default", "test.yaml", {"label_name": "bar"}
+        )
+        response = api_spec.get.return_value.to_dict.return_value
+        response["metadata"]["annotations"] = rendered["metadata"]["annotations"]
+        deployment.deploy()
+        # neither the resource nor the variable is written
+        self.assertEqual([i[0] for i in api_spec.method_calls], ["get", "get"])
+
+        self.client.settings["skip_unchanged"] = False
+        deployment.deploy()
+        self.assertEqual(api_spec.replace.call_count, 2)
+
+    def test_update_strategy_invalid(self):
+        self.client.settings["update_strategy"] = "foo"
+        deployment, api_spec = self.make_deployment()
+        with self.assertRaises(ValueError):
+            deployment.deploy()
+
+    def test_merge_patch(self):
+        source = {"a": 1, "b": {"c": 1, "d": [1]}, "e": 1}
+        target = {"a": 1, "b": {"c": 2, "d": [1]}, "f": {"g": 1}}
+        self.assertEqual(
+            utils.merge_patch(source, target),
+            {"b": {"c": 2}, "e": None, "f": {"g": 1}},
+        )
+        self.assertEqual(utils.merge_patch(source, source), {})
+
     def test_update_deployment_dry(self):
         mock_response = {
             "metadata": {